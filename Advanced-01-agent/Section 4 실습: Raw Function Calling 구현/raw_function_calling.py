@@ -6,25 +6,303 @@ Section 4 실습: Raw Function Calling 구현과 MCP로의 연결
 에이전트의 심장인 While 루프와 JSON Schema 설계를 직접 체험할 수 있습니다.
 """
 
+import ast
+import asyncio
+import contextlib
+import functools
+import heapq
+import io
+import inspect
 import json
+import math
+import operator
 import os
-from typing import Dict, List, Any, Callable
+import re
+import sys
+import threading
+import time
+import weakref
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from types import SimpleNamespace
+from typing import Dict, Iterable, Iterator, List, Any, Callable, Literal, Optional, Union, get_args, get_origin, get_type_hints
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI, Stream
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
 
 load_dotenv()
 
-# Gemini API 클라이언트 초기화
-gemini_api_key = os.getenv("GEMINI_API_KEY")
-client = OpenAI(
-    api_key=gemini_api_key,
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai"
-)
+# Gemini API 클라이언트 - 처음 사용할 때 생성 (테스트에서는 client 인자로 교체 가능)
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/openai"
+_client: Optional[OpenAI] = None
+# 비동기 클라이언트는 이벤트 루프마다 하나 - httpx 연결 풀이 만든 루프에 묶이므로
+# asyncio.run()을 여러 번 호출해도 닫힌 루프의 연결을 재사용하지 않음
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+
+
+def get_client() -> OpenAI:
+    """동기 Gemini 클라이언트 (OpenAI 호환 엔드포인트)"""
+    global _client
+    if _client is None:
+        _client = OpenAI(api_key=os.getenv("GEMINI_API_KEY"), base_url=GEMINI_BASE_URL)
+    return _client
+
+
+def get_async_client() -> AsyncOpenAI:
+    """비동기 Gemini 클라이언트 - 실행 중인 이벤트 루프마다 하나 (코루틴 안에서 호출)"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncOpenAI(api_key=os.getenv("GEMINI_API_KEY"),
+                                                    base_url=GEMINI_BASE_URL)
+    return client
+
 
 # ============================================================================
 # [1단계: Schema Design - 모델이 읽는 매뉴얼]
 # ============================================================================
 
+# 파이썬 타입 힌트 → JSON Schema 타입
+JSON_TYPES: Dict[Any, str] = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    list: "array",
+    dict: "object",
+}
+
+
+def param_schema(annotation: Any) -> Dict[str, Any]:
+    """타입 힌트 하나를 JSON Schema 조각으로 변환 (Literal은 enum, List[X]는 items 포함)"""
+    origin = get_origin(annotation)
+    if origin is Literal:
+        values = list(get_args(annotation))
+        return {"type": JSON_TYPES.get(type(values[0]), "string"), "enum": values}
+    if origin in (list, List):
+        args = get_args(annotation)
+        schema = {"type": "array"}
+        if args:
+            schema["items"] = param_schema(args[0])
+        return schema
+    return {"type": JSON_TYPES.get(origin or annotation, "string")}
+
+
+# ──────────────────────────────────────────────────────────
+# 도구 검색 - 질문과 관련 있는 도구만 골라 프롬프트를 줄임
+# ──────────────────────────────────────────────────────────
+# 도구가 수백 개가 되면 매 요청마다 모든 Schema를 보내는 것만으로 입력 토큰과 지연이 커집니다.
+# 각 도구의 이름·설명·인자 설명을 한 번 BM25로 색인하고, 질문마다 상위 k개만 모델에게 보냅니다.
+
+_WORD_RE = re.compile(r"[가-힣]+|[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    색인/검색용 토큰화 - 영문·숫자는 단어, 한글은 글자 2-gram
+    
+    한글은 조사가 붙어 '주가가', '날씨를'처럼 형태가 바뀌므로 2-gram으로 쪼개야 서로 맞춰집니다.
+    """
+    tokens = []
+    for word in _WORD_RE.findall(text.lower()):
+        if len(word) > 1 and "가" <= word[0] <= "힣":
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+class ToolIndex:
+    """
+    도구 설명에 대한 BM25 역색인 (도구 목록이 고정된 뒤 한 번 생성)
+    
+    검색은 질문 토큰이 등장하는 도구의 posting만 훑으므로 도구 수에 거의 비례하지 않습니다.
+    """
+    
+    def __init__(self, documents: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(documents)
+        self.postings: Dict[str, List[tuple]] = {}  # 토큰 → [(문서 번호, 빈도)]
+        self.lengths: List[int] = []
+        for doc_id, text in enumerate(documents):
+            tokens = tokenize(text)
+            self.lengths.append(len(tokens))
+            for token, freq in Counter(tokens).items():
+                self.postings.setdefault(token, []).append((doc_id, freq))
+        self.average_length = sum(self.lengths) / self.size if self.size else 0.0
+        self.idf = {
+            token: math.log(1 + (self.size - len(posting) + 0.5) / (len(posting) + 0.5))
+            for token, posting in self.postings.items()
+        }
+    
+    def search(self, query: str, k: int) -> List[int]:
+        """점수가 높은 순서로 최대 k개의 문서 번호 (일치하는 토큰이 없으면 빈 목록)"""
+        scores: Dict[int, float] = {}
+        k1, b, avg, lengths = self.k1, self.b, self.average_length or 1.0, self.lengths
+        for token in set(tokenize(query)):
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            idf = self.idf[token]
+            for doc_id, freq in posting:
+                norm = k1 * (1 - b + b * lengths[doc_id] / avg)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * freq * (k1 + 1) / (freq + norm)
+        return heapq.nlargest(k, scores, key=scores.__getitem__)
+
+
+class ToolSelection:
+    """레지스트리에서 고른 도구 일부 - create_completion에 ToolRegistry 대신 넘길 수 있음"""
+    
+    def __init__(self, names: List[str], schemas: List[Dict[str, Any]], schemas_json: bytes):
+        self.names = names
+        self.schemas = schemas
+        self.schemas_json = schemas_json
+    
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+class ToolRegistry:
+    """
+    함수 레지스트리 - 구현, JSON Schema, 캐시 정책을 한곳에서 관리
+    
+    @registry.tool(...)로 등록하면 시그니처와 타입 힌트에서 Schema를 만들어 줍니다.
+    freeze() 이후에는 Schema 목록과 그 직렬화된 JSON 바이트를 한 번만 만들어 두고
+    매 요청마다 재사용합니다 (도구가 많을수록 반복마다 드는 직렬화 비용이 사라짐).
+    """
+    
+    def __init__(self):
+        self.functions: Dict[str, Callable] = {}
+        self.cache_policies: Dict[str, Dict[str, Any]] = {}
+        self._schemas: List[Dict[str, Any]] = []
+        self._frozen: Optional[tuple] = None
+        self._frozen_json: Optional[bytes] = None
+        self._schema_parts: List[bytes] = []  # 도구별 Schema JSON (부분 집합을 이어 붙일 때 사용)
+        self._index: Optional[ToolIndex] = None
+    
+    def tool(self, description: Optional[str] = None, params: Optional[Dict[str, str]] = None,
+             name: Optional[str] = None, cache: Optional[Dict[str, Any]] = None):
+        """
+        도구 등록 데코레이터
+        
+        Args:
+            description: 모델이 읽는 도구 설명 (없으면 docstring 첫 줄)
+            params: 인자 이름 → 설명
+            name: 도구 이름 (없으면 함수 이름)
+            cache: ToolResultCache 정책 (예: {"ttl": 5.0}) - 없으면 캐시하지 않음
+        """
+        def decorator(func: Callable) -> Callable:
+            self.register(func, description, params, name, cache)
+            return func
+        return decorator
+    
+    def register(self, func: Callable, description: Optional[str] = None,
+                 params: Optional[Dict[str, str]] = None, name: Optional[str] = None,
+                 cache: Optional[Dict[str, Any]] = None):
+        if self._frozen is not None:
+            raise RuntimeError("freeze() 이후에는 도구를 등록할 수 없습니다.")
+        name = name or func.__name__
+        if name in self.functions:
+            raise ValueError(f"이미 등록된 도구입니다: {name}")
+        params = params or {}
+        hints = get_type_hints(func)
+        
+        properties: Dict[str, Any] = {}
+        required: List[str] = []
+        for param in inspect.signature(func).parameters.values():
+            prop = param_schema(hints.get(param.name, str))
+            if param.name in params:
+                prop["description"] = params[param.name]
+            if param.default is inspect.Parameter.empty:
+                required.append(param.name)
+            else:
+                prop["default"] = param.default
+            properties[param.name] = prop
+        
+        self.functions[name] = func
+        if cache is not None:
+            self.cache_policies[name] = cache
+        self._schemas.append({
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": description or (inspect.getdoc(func) or name).splitlines()[0],
+                "parameters": {"type": "object", "properties": properties, "required": required},
+            },
+        })
+    
+    def freeze(self) -> "ToolRegistry":
+        """Schema 목록을 고정하고 tools 필드의 JSON 바이트를 미리 만들어 둠"""
+        if self._frozen is None:
+            self._frozen = tuple(self._schemas)
+            self._schema_parts = [json.dumps(schema, ensure_ascii=False, separators=(",", ":")).encode()
+                                  for schema in self._schemas]
+            self._frozen_json = b"[" + b",".join(self._schema_parts) + b"]"
+        return self
+    
+    @property
+    def index(self) -> ToolIndex:
+        """이름·설명·인자 설명으로 만든 BM25 색인 (처음 검색할 때 한 번 생성)"""
+        if self._index is None:
+            self.freeze()
+            documents = []
+            for schema in self._frozen:
+                function = schema["function"]
+                params = function["parameters"]["properties"]
+                documents.append(" ".join([
+                    function["name"].replace("_", " "),
+                    function["description"],
+                    *(prop.get("description", "") for prop in params.values()),
+                ]))
+            self._index = ToolIndex(documents)
+        return self._index
+    
+    def select(self, query: str, k: int) -> "ToolSet":
+        """
+        질문과 관련 있는 상위 k개 도구
+        
+        도구가 k개 이하이면 레지스트리 자체를, 일치하는 도구가 없으면 등록 순서상 앞의 k개를 돌려줍니다.
+        """
+        if len(self.functions) <= k:
+            return self.freeze()
+        positions = self.index.search(query, k) or list(range(k))
+        return ToolSelection(
+            names=[self._frozen[i]["function"]["name"] for i in positions],
+            schemas=[self._frozen[i] for i in positions],
+            schemas_json=b"[" + b",".join(self._schema_parts[i] for i in positions) + b"]",
+        )
+    
+    @property
+    def schemas(self) -> List[Dict[str, Any]]:
+        """SDK의 tools 인자로 넘길 Schema 목록 (freeze 후에는 같은 객체를 재사용)"""
+        self.freeze()
+        return list(self._frozen)
+    
+    @property
+    def schemas_json(self) -> bytes:
+        """미리 직렬화해 둔 tools 배열 (JSON 바이트)"""
+        self.freeze()
+        return self._frozen_json
+    
+    def __len__(self) -> int:
+        return len(self.functions)
+    
+    def __contains__(self, name: str) -> bool:
+        return name in self.functions
+
+
+# 모델에게 보낼 도구 묶음 - 전체 레지스트리 또는 select()로 고른 일부
+ToolSet = Union[ToolRegistry, ToolSelection]
+
+registry = ToolRegistry()
+
+
+@registry.tool(
+    description="주식의 현재 가격과 변동률을 조회합니다. 삼성전자, 애플, 테슬라 등의 주가를 확인할 때 사용합니다.",
+    params={"symbol": "주식 심볼 코드 (예: 'AAPL'은 애플, '005930'은 삼성전자, 'TSLA'는 테슬라)"},
+    cache={"ttl": 5.0, "max_entries": 256},  # 시세는 짧게만 보관
+)
 def get_stock_price(symbol: str) -> Dict[str, Any]:
     """주식 가격을 조회하는 함수 (시뮬레이션)"""
     stock_data = {
@@ -40,7 +318,15 @@ def get_stock_price(symbol: str) -> Dict[str, Any]:
     })
 
 
-def get_weather(location: str, units: str = "metric") -> Dict[str, Any]:
+@registry.tool(
+    description="특정 도시의 현재 날씨 정보를 조회합니다. 온도, 날씨 상태, 습도를 확인할 때 사용합니다.",
+    params={
+        "location": "도시 이름 (예: 'Seoul', 'Tokyo', 'New York')",
+        "units": "온도 단위: 'metric'은 섭씨, 'imperial'은 화씨",
+    },
+    cache={"ttl": 300.0, "max_entries": 256},
+)
+def get_weather(location: str, units: Literal["metric", "imperial"] = "metric") -> Dict[str, Any]:
     """날씨 정보를 조회하는 함수 (시뮬레이션)"""
     weather_data = {
         "seoul": {"temp": 15, "condition": "맑음", "humidity": 65},
@@ -63,102 +349,706 @@ def get_weather(location: str, units: str = "metric") -> Dict[str, Any]:
     return data
 
 
+# ──────────────────────────────────────────────────────────
+# 안전한 수식 엔진 - eval 대신 산술 전용 AST를 검증해 함수로 컴파일
+# ──────────────────────────────────────────────────────────
+# eval(expression)은 호출마다 수식을 새로 컴파일하고, 모델이 보낸 임의의 파이썬 코드를 실행합니다.
+# 여기서는 수식을 한 번 파싱해 산술 연산·허용된 수학 함수만 남았는지 검사한 뒤
+# `lambda <변수들>: <수식>` 바이트코드로 컴파일하고, 수식 문자열 단위로 캐시합니다.
+# 검증을 통과한 트리에는 속성 접근·임의 이름이 없으므로 컴파일된 함수는 허용된 이름만 볼 수 있습니다.
+
+MAX_EXPRESSION_LENGTH = 1000
+MAX_POWER_BITS = 100_000  # 9**9**9 같은 거대한 정수 거듭제곱 차단
+
+
+class ExpressionError(ValueError):
+    """허용되지 않는 수식 (산술 이외의 구문, 모르는 이름 등)"""
+
+
+def _safe_pow(base, exponent):
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0 and abs(base) > 1:
+        if exponent * abs(base).bit_length() > MAX_POWER_BITS:
+            raise ExpressionError("거듭제곱 결과가 너무 큽니다.")
+    return base ** exponent
+
+
+def _safe_factorial(n):
+    if n > 1000:
+        raise ExpressionError("factorial 인자가 너무 큽니다.")
+    return math.factorial(n)
+
+
+SAFE_FUNCTIONS: Dict[str, Callable] = {
+    "abs": abs, "round": round, "min": min, "max": max, "pow": _safe_pow, "factorial": _safe_factorial,
+    **{name: getattr(math, name) for name in (
+        "sqrt", "exp", "log", "log2", "log10", "sin", "cos", "tan", "asin", "acos", "atan",
+        "atan2", "sinh", "cosh", "tanh", "floor", "ceil", "fabs", "hypot", "degrees", "radians", "gcd")},
+}
+SAFE_CONSTANTS: Dict[str, float] = {"pi": math.pi, "e": math.e, "tau": math.tau}
+
+# 컴파일된 수식 함수가 볼 수 있는 유일한 전역 이름들
+_EXPRESSION_GLOBALS: Dict[str, Any] = {"__builtins__": {}, "_pow": _safe_pow, **SAFE_FUNCTIONS, **SAFE_CONSTANTS}
+
+_ARITHMETIC_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.UAdd, ast.USub)
+
+
+class _ArithmeticValidator(ast.NodeTransformer):
+    """
+    산술이 아닌 노드는 모두 거부하고, 컴파일할 수 있게 정리
+    
+    - math.pi / math.sqrt(x) → pi / sqrt(x)
+    - a ** b → _pow(a, b) (거대한 거듭제곱 차단)
+    - 그 밖의 이름은 변수로 모음 (나중에 lambda의 인자가 됨)
+    """
+    
+    def __init__(self):
+        self.variables: set = set()
+    
+    def generic_visit(self, node):
+        raise ExpressionError(f"허용되지 않는 구문: {type(node).__name__}")
+    
+    def visit_Expression(self, node):
+        node.body = self.visit(node.body)
+        return node
+    
+    def visit_Constant(self, node):
+        if type(node.value) not in (int, float):
+            raise ExpressionError(f"숫자가 아닌 값: {node.value!r}")
+        return node
+    
+    def visit_Name(self, node):
+        if node.id in SAFE_FUNCTIONS:
+            raise ExpressionError(f"함수는 호출해야 합니다: {node.id}")
+        if node.id not in SAFE_CONSTANTS:
+            if node.id.startswith("_"):
+                raise ExpressionError(f"허용되지 않는 이름: {node.id}")
+            self.variables.add(node.id)
+        return node
+    
+    def visit_Attribute(self, node):
+        if isinstance(node.value, ast.Name) and node.value.id == "math" and node.attr in SAFE_CONSTANTS:
+            return ast.copy_location(ast.Name(node.attr, ast.Load()), node)
+        raise ExpressionError(f"허용되지 않는 속성 접근: {ast.unparse(node)}")
+    
+    def visit_Call(self, node):
+        func = node.func
+        if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == "math":
+            name = func.attr
+        elif isinstance(func, ast.Name):
+            name = func.id
+        else:
+            raise ExpressionError(f"허용되지 않는 호출: {ast.unparse(func)}")
+        if name not in SAFE_FUNCTIONS:
+            raise ExpressionError(f"허용되지 않는 함수: {name}")
+        if node.keywords:
+            raise ExpressionError(f"키워드 인자는 사용할 수 없습니다: {name}")
+        node.func = ast.copy_location(ast.Name(name, ast.Load()), func)
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+    
+    def visit_BinOp(self, node):
+        if not isinstance(node.op, _ARITHMETIC_OPS):
+            raise ExpressionError(f"허용되지 않는 연산자: {type(node.op).__name__}")
+        left, right = self.visit(node.left), self.visit(node.right)
+        if isinstance(node.op, ast.Pow):
+            return ast.copy_location(ast.Call(ast.Name("_pow", ast.Load()), [left, right], []), node)
+        node.left, node.right = left, right
+        return node
+    
+    def visit_UnaryOp(self, node):
+        if not isinstance(node.op, _ARITHMETIC_OPS):
+            raise ExpressionError(f"허용되지 않는 연산자: {type(node.op).__name__}")
+        node.operand = self.visit(node.operand)
+        return node
+
+
+class CompiledExpression:
+    """
+    컴파일된 수식 - 같은 수식을 여러 번, 여러 변수 값으로 빠르게 계산
+    
+    사용 예:
+        expr = compile_expression("price * (1 + rate) ** years")
+        expr(price=100, rate=0.05, years=3)
+        expr.evaluate_many({"price": [100, 200], "rate": [0.05, 0.03], "years": [3, 5]})
+    """
+    
+    __slots__ = ("expression", "variables", "_fn", "_value")
+    
+    def __init__(self, expression: str, fn: Callable, variables: tuple):
+        self.expression = expression
+        self.variables = variables  # lambda 인자 순서 (이름순)
+        self._fn = fn
+        # 변수가 없으면 한 번만 계산해 둠
+        self._value = fn() if not variables else None
+    
+    def __call__(self, **bindings):
+        return self.evaluate(bindings)
+    
+    def _missing(self, names) -> ExpressionError:
+        missing = [v for v in self.variables if v not in names]
+        return ExpressionError(f"값이 없는 변수: {', '.join(missing)}")
+    
+    def evaluate(self, env: Optional[Dict[str, Any]] = None):
+        if not self.variables:
+            return self._value
+        env = env or {}
+        try:
+            return self._fn(*[env[v] for v in self.variables])
+        except KeyError:
+            raise self._missing(env) from None
+    
+    def evaluate_many(self, bindings: Union[Iterable[Dict[str, Any]], Dict[str, List[Any]]]) -> List[Any]:
+        """
+        여러 변수 바인딩에 대해 한 번에 계산 (dict 목록 또는 변수별 값 목록)
+        
+        파싱·검증·컴파일은 한 번만 하고, 바인딩마다 컴파일된 함수만 호출합니다.
+        """
+        if isinstance(bindings, dict):  # 변수별 값 목록 (열 단위)
+            if not self.variables:
+                return [self._value] * len(next(iter(bindings.values()), []))
+            try:
+                columns = [bindings[v] for v in self.variables]
+            except KeyError:
+                raise self._missing(bindings) from None
+            return list(map(self._fn, *columns))
+        if not self.variables:
+            return [self._value for _ in bindings]
+        fn, names = self._fn, self.variables
+        try:
+            if len(names) == 1:
+                (name,) = names
+                return [fn(env[name]) for env in bindings]
+            getter = operator.itemgetter(*names)
+            return [fn(*getter(env)) for env in bindings]
+        except KeyError as e:
+            raise ExpressionError(f"값이 없는 변수: {e.args[0]}") from None
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_expression(expression: str) -> CompiledExpression:
+    """수식을 검증·컴파일 (수식 문자열 단위로 캐시). 산술이 아니면 ExpressionError"""
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError(f"수식이 너무 깁니다 (최대 {MAX_EXPRESSION_LENGTH}자).")
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ExpressionError(f"수식 문법 오류: {e.msg}") from None
+    validator = _ArithmeticValidator()
+    tree = validator.visit(tree)
+    
+    variables = tuple(sorted(validator.variables))
+    arguments = ast.arguments(posonlyargs=[], args=[ast.arg(v) for v in variables],
+                              kwonlyargs=[], kw_defaults=[], defaults=[])
+    function = ast.Expression(ast.Lambda(arguments, tree.body))
+    ast.fix_missing_locations(function)
+    fn = eval(compile(function, "<expression>", "eval"), dict(_EXPRESSION_GLOBALS))  # 검증된 산술 트리만 컴파일
+    return CompiledExpression(expression, fn, variables)
+
+
+def safe_eval(expression: str, **bindings):
+    """eval의 안전한 대체 - 산술 수식만 계산"""
+    return compile_expression(expression).evaluate(bindings)
+
+
+@registry.tool(
+    description="수학적 계산을 수행합니다. 덧셈, 뺄셈, 곱셈, 나눗셈 등의 연산을 할 때 사용합니다.",
+    params={"expression": "계산할 수식 (예: '2 + 2', '10 * 5', '100 / 4')"},
+    cache={"ttl": None, "max_entries": 4096},  # 순수 함수 - 영구 보관
+)
 def calculate(expression: str) -> Dict[str, Any]:
-    """수식을 계산하는 함수"""
+    """수식을 계산하는 함수 (산술 수식만 허용 - 파이썬 코드는 실행하지 않음)"""
     try:
-        result = eval(expression)
+        result = safe_eval(expression)
         return {"result": result, "expression": expression}
     except Exception as e:
         return {"error": str(e), "expression": expression}
 
 
-# 함수 레지스트리
-FUNCTIONS: Dict[str, Callable] = {
-    "get_stock_price": get_stock_price,
-    "get_weather": get_weather,
-    "calculate": calculate,
-}
+# 시작 시 한 번 고정 - 이후 모든 요청이 같은 Schema와 JSON 바이트를 재사용
+registry.freeze()
 
-# JSON Schema 정의 - description 필드가 Semantic Matching의 핵심
-FUNCTIONS_SCHEMA = [
-    {
-        "type": "function",
-        "function": {
-            "name": "get_stock_price",
-            "description": "주식의 현재 가격과 변동률을 조회합니다. 삼성전자, 애플, 테슬라 등의 주가를 확인할 때 사용합니다.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "symbol": {
-                        "type": "string",
-                        "description": "주식 심볼 코드 (예: 'AAPL'은 애플, '005930'은 삼성전자, 'TSLA'는 테슬라)"
-                    }
-                },
-                "required": ["symbol"]
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_weather",
-            "description": "특정 도시의 현재 날씨 정보를 조회합니다. 온도, 날씨 상태, 습도를 확인할 때 사용합니다.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "location": {
-                        "type": "string",
-                        "description": "도시 이름 (예: 'Seoul', 'Tokyo', 'New York')"
-                    },
-                    "units": {
-                        "type": "string",
-                        "enum": ["metric", "imperial"],
-                        "description": "온도 단위: 'metric'은 섭씨, 'imperial'은 화씨",
-                        "default": "metric"
-                    }
-                },
-                "required": ["location"]
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "calculate",
-            "description": "수학적 계산을 수행합니다. 덧셈, 뺄셈, 곱셈, 나눗셈 등의 연산을 할 때 사용합니다.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "expression": {
-                        "type": "string",
-                        "description": "계산할 수식 (예: '2 + 2', '10 * 5', '100 / 4')"
-                    }
-                },
-                "required": ["expression"]
-            }
-        }
-    }
-]
+# 함수 레지스트리 (이름 → 구현)
+FUNCTIONS: Dict[str, Callable] = registry.functions
+
+# 도구별 결과 캐시 정책 - ttl=None은 영구 보관 (같은 입력 → 같은 출력인 순수 함수)
+# 시세처럼 시간에 민감한 도구는 짧은 TTL, 캐시하면 안 되는 도구는 cache를 지정하지 않습니다.
+TOOL_CACHE_POLICIES: Dict[str, Dict[str, Any]] = registry.cache_policies
+
+# JSON Schema - 시그니처에서 생성됨. description 필드가 Semantic Matching의 핵심
+FUNCTIONS_SCHEMA: List[Dict[str, Any]] = registry.schemas
 
 
 # ============================================================================
 # [2단계: The Loop - 에이전트를 움직이는 심장]
 # ============================================================================
 
+class ToolResultCache:
+    """
+    도구 하나의 결과 캐시 - 정규화된 인자 → 직렬화된 JSON 문자열
+    
+    ttl(초)이 지난 항목은 만료되고, max_entries/max_bytes를 넘으면 가장 오래 안 쓴 항목부터 제거합니다(LRU).
+    JSON 문자열을 그대로 보관하므로 적중 시 함수 실행과 json.dumps를 모두 건너뜁니다.
+    """
+    
+    def __init__(self, ttl: Optional[float] = None, max_entries: int = 1024,
+                 max_bytes: int = 1024 * 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key → (만료 시각, JSON)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+    
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, payload = entry
+                if expires is None or expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return payload
+                self._remove(key)
+                self.expirations += 1
+            self.misses += 1
+            return None
+    
+    def put(self, key: str, payload: str):
+        size = len(key) + len(payload)
+        if size > self.max_bytes:
+            return
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires, payload)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+    
+    def _remove(self, key: str):
+        _, payload = self._entries.pop(key)
+        self._bytes -= len(key) + len(payload)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+        }
+
+
+tool_caches: Dict[str, ToolResultCache] = {
+    name: ToolResultCache(**policy) for name, policy in TOOL_CACHE_POLICIES.items()
+}
+
+# 시그니처는 한 번만 만들어 둡니다 (inspect.signature는 호출마다 비용이 큼)
+_signatures: Dict[Callable, inspect.Signature] = {}
+
+
+def canonical_arguments(func: Callable, arguments: Dict[str, Any]) -> str:
+    """
+    캐시 키용 인자 정규화 - 기본값을 채우고 키를 정렬한 JSON
+    
+    {"location": "Seoul"}과 {"units": "metric", "location": "Seoul"}은 같은 키가 됩니다.
+    """
+    signature = _signatures.get(func)
+    if signature is None:
+        signature = _signatures[func] = inspect.signature(func)
+    bound = signature.bind(**arguments)
+    bound.apply_defaults()
+    return json.dumps(bound.arguments, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+
 def execute_function(function_name: str, arguments: Dict[str, Any]) -> str:
-    """함수를 실행하고 결과를 JSON 문자열로 반환"""
+    """함수를 실행하고 결과를 JSON 문자열로 반환 (캐시 정책이 있는 도구는 캐시 사용)"""
     if function_name not in FUNCTIONS:
         return json.dumps({"error": f"Unknown function: {function_name}"})
     
+    func = FUNCTIONS[function_name]
+    cache = tool_caches.get(function_name)
+    key = None
+    if cache is not None:
+        try:
+            key = canonical_arguments(func, arguments)
+        except TypeError:
+            key = None  # 잘못된 인자 - 아래 호출에서 오류로 보고
+        if key is not None:
+            payload = cache.get(key)
+            if payload is not None:
+                return payload
+    
     try:
-        func = FUNCTIONS[function_name]
         result = func(**arguments)
-        return json.dumps(result, ensure_ascii=False)
+        payload = json.dumps(result, ensure_ascii=False)
     except Exception as e:
         return json.dumps({"error": str(e)})
+    
+    if key is not None:
+        cache.put(key, payload)
+    return payload
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """도구별 캐시 적중/미스 통계"""
+    return {name: cache.stats() for name, cache in tool_caches.items()}
+
+
+def print_cache_stats():
+    print(f"\n📦 도구 결과 캐시")
+    print(f"{'도구':<18} {'적중':>8} {'미스':>8} {'적중률':>8} {'항목':>6} {'바이트':>8}")
+    for name, stats in cache_stats().items():
+        print(f"{name:<18} {stats['hits']:>8} {stats['misses']:>8} {stats['hit_rate']:>8.1%} "
+              f"{stats['entries']:>6} {stats['bytes']:>8}")
 
 
-def run_agent(user_query: str, model: str = "gemini-flash-latest") -> str:
+# ──────────────────────────────────────────────────────────
+# 병렬 도구 실행 - 서로 독립적인 tool_calls를 동시에 실행
+# ──────────────────────────────────────────────────────────
+# 모델이 한 번에 여러 도구(서울 날씨 + 도쿄 날씨 + 주가)를 요청하면
+# 순차 실행은 지연 시간이 '합'이 되지만, 동시 실행은 '최댓값'이 됩니다.
+
+DEFAULT_TOOL_TIMEOUT = 10.0  # 초
+
+# 도구별 타임아웃 (초) - 없으면 DEFAULT_TOOL_TIMEOUT
+TOOL_TIMEOUTS: Dict[str, float] = {
+    "get_stock_price": 5.0,
+    "get_weather": 5.0,
+    "calculate": 2.0,
+}
+
+
+def parse_tool_call(tool_call) -> tuple:
+    """tool_call에서 (id, 함수 이름, 인자 dict 또는 파싱 오류 메시지)를 꺼냄"""
+    try:
+        arguments = json.loads(tool_call.function.arguments or "{}")
+    except json.JSONDecodeError as e:
+        arguments = f"인자 JSON 파싱 실패: {e}"
+    return tool_call.id, tool_call.function.name, arguments
+
+
+class ToolExecutor:
+    """
+    tool_calls를 동시에 실행하는 실행기
+    
+    Args:
+        backend: "thread" (스레드 풀) 또는 "asyncio" (이벤트 루프 + to_thread)
+        max_workers: 스레드 풀 크기
+        timeouts: 도구별 타임아웃 (기본값: TOOL_TIMEOUTS)
+    
+    결과는 항상 입력 tool_calls 순서대로 반환되므로 대화 기록이 결정적으로 유지됩니다.
+    타임아웃된 도구는 오류 결과로 대체됩니다 (스레드는 강제 종료할 수 없어 백그라운드에서 끝남).
+    """
+
+    def __init__(self, backend: str = "thread", max_workers: int = 8,
+                 timeouts: Optional[Dict[str, float]] = None,
+                 default_timeout: float = DEFAULT_TOOL_TIMEOUT):
+        if backend not in ("thread", "asyncio"):
+            raise ValueError(f"지원하지 않는 backend: {backend}")
+        self.backend = backend
+        self.max_workers = max_workers
+        self.timeouts = TOOL_TIMEOUTS if timeouts is None else timeouts
+        self.default_timeout = default_timeout
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def timeout_for(self, function_name: str) -> float:
+        return self.timeouts.get(function_name, self.default_timeout)
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="tool")
+        return self._pool
+
+    def _timeout_result(self, function_name: str) -> str:
+        return json.dumps({"error": f"{function_name} 실행 시간 초과 "
+                                    f"({self.timeout_for(function_name):g}초)"},
+                          ensure_ascii=False)
+
+    def run(self, tool_calls: list) -> List[str]:
+        """tool_calls를 동시에 실행하고 결과 JSON 문자열을 같은 순서로 반환"""
+        calls = [parse_tool_call(tc) for tc in tool_calls]
+        if self.backend == "asyncio":
+            return asyncio.run(self._gather(calls))
+
+        started = time.monotonic()
+        futures = [self.submit(name, args) for _, name, args in calls]
+        return [self.result(name, args, future, started)
+                for (_, name, args), future in zip(calls, futures)]
+
+    def submit(self, name: str, args):
+        """도구 하나를 스레드 풀에 제출 (인자 파싱에 실패했으면 None)"""
+        if not isinstance(args, dict):
+            return None
+        return self.pool.submit(execute_function, name, args)
+
+    def result(self, name: str, args, future, started: float) -> str:
+        """submit()한 도구의 결과 - started(time.monotonic) 기준으로 타임아웃 적용"""
+        if future is None:
+            return json.dumps({"error": args}, ensure_ascii=False)
+        remaining = started + self.timeout_for(name) - time.monotonic()
+        try:
+            return future.result(timeout=max(0.0, remaining))
+        except FutureTimeoutError:
+            future.cancel()
+            return self._timeout_result(name)
+
+    async def run_async(self, tool_calls: list) -> List[str]:
+        """run()의 비동기 버전 - 이미 실행 중인 이벤트 루프 안에서 사용"""
+        return await self._gather([parse_tool_call(tc) for tc in tool_calls])
+
+    async def _gather(self, calls: list) -> List[str]:
+        loop = asyncio.get_running_loop()
+
+        async def one(name, args):
+            if not isinstance(args, dict):
+                return json.dumps({"error": args}, ensure_ascii=False)
+            try:
+                return await asyncio.wait_for(
+                    loop.run_in_executor(self.pool, execute_function, name, args),
+                    self.timeout_for(name),
+                )
+            except asyncio.TimeoutError:
+                return self._timeout_result(name)
+
+        return list(await asyncio.gather(*(one(name, args) for _, name, args in calls)))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# 기본 실행기 (스레드 풀 백엔드)
+tool_executor = ToolExecutor()
+
+SYSTEM_PROMPT = """당신은 유용한 AI 어시스턴트입니다. 
+사용자의 질문에 답하기 위해 필요한 도구를 사용할 수 있습니다.
+함수 실행 결과를 관찰한 후, 사용자에게 명확하고 도움이 되는 답변을 제공하세요."""
+
+MAX_ITERATIONS = 10  # 무한 루프 방지
+TOOL_TOP_K = 8  # 요청마다 보낼 최대 도구 수 (도구가 이보다 적으면 전부 보냄)
+CONTEXT_TOKEN_BUDGET = 8000  # 요청마다 보낼 대화 기록의 최대 토큰 수 (추정치)
+MAX_TOOL_RESULT_CHARS = 2000  # 도구 결과 하나의 최대 길이
+OBSERVATION_SUMMARY_CHARS = 200  # 압축된 옛 도구 결과의 길이
+
+
+def initial_messages(user_query: str) -> List[Dict[str, Any]]:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_query},
+    ]
+
+
+def assistant_entry(assistant_message) -> Dict[str, Any]:
+    """응답 메시지를 대화 기록용 dict로 변환"""
+    return {
+        "role": "assistant",
+        "content": assistant_message.content,
+        "tool_calls": [
+            {
+                "id": tc.id,
+                "type": tc.type,
+                "function": {
+                    "name": tc.function.name,
+                    "arguments": tc.function.arguments
+                }
+            } for tc in (assistant_message.tool_calls or [])
+        ]
+    }
+
+
+# ──────────────────────────────────────────────────────────
+# 대화 기록 압축 - 긴 대화에서도 요청 크기를 일정하게 유지
+# ──────────────────────────────────────────────────────────
+# 모든 응답과 도구 결과를 계속 쌓아 매번 보내면, 턴마다 요청이 커져
+# 대화 전체 비용이 턴 수의 제곱으로 늘어납니다.
+# 도구 결과는 추가할 때 길이를 자르고, 토큰 예산을 넘으면 오래된 관찰부터
+# 짧은 요약으로 바꾸고, 그래도 넘치면 가장 오래된 턴(응답 + 도구 결과)을 통째로 뺍니다.
+
+MESSAGE_OVERHEAD_TOKENS = 4  # 메시지마다 붙는 역할·구분자 몫
+SUMMARY_PREFIX = "[이전 관찰 요약] "
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    로컬 토큰 수 추정 (토크나이저 없이) - 영문은 4글자당 1토큰, 한글 등 비ASCII는 글자당 1토큰
+    
+    실제보다 약간 크게 잡으므로 예산 검사용으로 안전합니다.
+    """
+    if not text:
+        return 0
+    if text.isascii():
+        return len(text) // 4 + 1
+    non_ascii = len(text) - len(text.encode("ascii", "ignore"))
+    return (len(text) - non_ascii) // 4 + non_ascii + 1
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    tokens = MESSAGE_OVERHEAD_TOKENS + estimate_tokens(message.get("content"))
+    for tc in message.get("tool_calls") or ():
+        tokens += estimate_tokens(tc["function"]["name"]) + estimate_tokens(tc["function"]["arguments"])
+    return tokens
+
+
+def truncate_text(text: str, limit: int) -> str:
+    """앞부분만 남기고 잘린 길이를 표시"""
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}…(+{len(text) - limit}자 생략)"
+
+
+class ContextWindow:
+    """
+    토큰 예산 안에서 유지되는 대화 기록
+    
+    메시지별 토큰 추정치를 함께 들고 있어, 예산 검사에 전체를 다시 세지 않습니다.
+    시스템 프롬프트·사용자 질문과 가장 최근 턴은 항상 원본 그대로 남습니다.
+    """
+    
+    def __init__(self, user_query: str, budget: int = CONTEXT_TOKEN_BUDGET,
+                 max_tool_chars: int = MAX_TOOL_RESULT_CHARS,
+                 summary_chars: int = OBSERVATION_SUMMARY_CHARS):
+        self.budget = budget
+        self.max_tool_chars = max_tool_chars
+        self.summary_chars = summary_chars
+        self.messages: List[Dict[str, Any]] = []
+        self._tokens: List[int] = []
+        self.total_tokens = 0
+        self.summarized = 0  # 요약으로 바뀐 도구 결과 수
+        self.dropped_turns = 0  # 통째로 빠진 턴 수
+        for message in initial_messages(user_query):
+            self.append(message)
+    
+    def append(self, message: Dict[str, Any]):
+        tokens = message_tokens(message)
+        self.messages.append(message)
+        self._tokens.append(tokens)
+        self.total_tokens += tokens
+    
+    def add_tool_result(self, tool_call, content: str):
+        """도구 결과 추가 (max_tool_chars에서 자름)"""
+        self.append({
+            "role": "tool",
+            "tool_call_id": tool_call.id,
+            "name": tool_call.function.name,
+            "content": truncate_text(content, self.max_tool_chars),
+        })
+    
+    def _set(self, i: int, message: Dict[str, Any]):
+        tokens = message_tokens(message)
+        self.total_tokens += tokens - self._tokens[i]
+        self.messages[i] = message
+        self._tokens[i] = tokens
+    
+    def compact(self) -> bool:
+        """예산을 넘으면 압축 - 압축했으면 True"""
+        if self.total_tokens <= self.budget:
+            return False
+        # 가장 최근 턴(마지막 assistant 메시지부터 끝까지)은 건드리지 않음
+        last_turn = max((i for i, m in enumerate(self.messages) if m["role"] == "assistant"), default=2)
+        
+        # 1단계: 오래된 관찰부터 짧은 요약으로 교체
+        for i in range(2, last_turn):
+            if self.total_tokens <= self.budget:
+                return True
+            message = self.messages[i]
+            if message["role"] == "tool" and not message["content"].startswith(SUMMARY_PREFIX):
+                summary = SUMMARY_PREFIX + truncate_text(message["content"], self.summary_chars)
+                self._set(i, dict(message, content=summary))
+                self.summarized += 1
+        
+        # 2단계: 가장 오래된 턴을 통째로 제거 (assistant와 그 tool 결과를 함께 빼야 짝이 맞음)
+        while self.total_tokens > self.budget and last_turn > 2:
+            end = 3
+            while end < last_turn and self.messages[end]["role"] == "tool":
+                end += 1
+            self.total_tokens -= sum(self._tokens[2:end])
+            del self.messages[2:end], self._tokens[2:end]
+            last_turn -= end - 2
+            self.dropped_turns += 1
+        return True
+    
+    def request_messages(self) -> List[Dict[str, Any]]:
+        """모델에게 보낼 메시지 (필요하면 먼저 압축)"""
+        self.compact()
+        return self.messages
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "messages": len(self.messages),
+            "tokens": self.total_tokens,
+            "summarized": self.summarized,
+            "dropped_turns": self.dropped_turns,
+        }
+
+
+# ──────────────────────────────────────────────────────────
+# 요청 생성 - 미리 직렬화한 tools 바이트를 매 요청에 재사용
+# ──────────────────────────────────────────────────────────
+# SDK에 tools=[...]를 넘기면 매 반복마다 Schema 전체를 다시 변환·직렬화합니다.
+# 실제 OpenAI 클라이언트에는 바뀌는 부분(model, messages)만 직렬화한 본문을 직접 보내고,
+# 그 외 클라이언트(StubAsyncClient 등)나 content 인자가 없는 구버전 SDK는 기존 방식으로 호출합니다.
+
+PREBUILT_BODY_SUPPORTED = "content" in inspect.signature(OpenAI.post).parameters
+
+
+def request_body(model: str, messages: List[Dict[str, Any]], tools: ToolSet = registry,
+                 stream: bool = False) -> bytes:
+    """chat.completions 요청 본문 - messages만 새로 직렬화하고 tools는 고정된 바이트를 이어 붙임"""
+    head = json.dumps({"model": model, "messages": messages}, ensure_ascii=False, separators=(",", ":"))
+    tail = b',"tool_choice":"auto","stream":true}' if stream else b',"tool_choice":"auto"}'
+    return head[:-1].encode() + b',"tools":' + tools.schemas_json + tail
+
+
+def create_completion(client, model: str, messages: List[Dict[str, Any]], tools: ToolSet = registry):
+    """모델 요청 1회 (tool_choice="auto")"""
+    if PREBUILT_BODY_SUPPORTED and isinstance(client, OpenAI):
+        return client.post("/chat/completions", cast_to=ChatCompletion,
+                           content=request_body(model, messages, tools))
+    return client.chat.completions.create(model=model, messages=messages,
+                                          tools=tools.schemas, tool_choice="auto")
+
+
+def create_completion_stream(client, model: str, messages: List[Dict[str, Any]],
+                             tools: ToolSet = registry) -> Iterator:
+    """스트리밍 모델 요청 - ChatCompletionChunk를 도착하는 대로 돌려주는 이터레이터"""
+    if PREBUILT_BODY_SUPPORTED and isinstance(client, OpenAI):
+        return client.post("/chat/completions", cast_to=ChatCompletion,
+                           content=request_body(model, messages, tools, stream=True),
+                           stream=True, stream_cls=Stream[ChatCompletionChunk])
+    return client.chat.completions.create(model=model, messages=messages, tools=tools.schemas,
+                                          tool_choice="auto", stream=True)
+
+
+async def create_completion_async(client, model: str, messages: List[Dict[str, Any]],
+                                  tools: ToolSet = registry):
+    """create_completion의 비동기 버전"""
+    if PREBUILT_BODY_SUPPORTED and isinstance(client, AsyncOpenAI):
+        return await client.post("/chat/completions", cast_to=ChatCompletion,
+                                 content=request_body(model, messages, tools))
+    return await client.chat.completions.create(model=model, messages=messages,
+                                                tools=tools.schemas, tool_choice="auto")
+
+
+def run_agent(user_query: str, model: str = "gemini-flash-latest",
+              executor: Optional[ToolExecutor] = None, client=None,
+              top_k: int = TOOL_TOP_K, context_budget: int = CONTEXT_TOKEN_BUDGET) -> str:
     """
     에이전트의 메인 루프 - ReAct 패턴 구현
     
@@ -178,24 +1068,20 @@ def run_agent(user_query: str, model: str = "gemini-flash-latest") -> str:
     Args:
         user_query: 사용자의 질문
         model: 사용할 Gemini 모델 (예: "gemini-1.5-flash", "gemini-1.5-pro")
+        executor: 도구 실행기 (기본값: 스레드 풀 기반 tool_executor)
+        client: OpenAI 호환 클라이언트 (기본값: get_client())
+        top_k: 질문과 관련 있는 도구를 최대 몇 개까지 보낼지 (BM25 검색)
+        context_budget: 요청마다 보낼 대화 기록의 토큰 예산 (넘으면 옛 관찰부터 압축)
     
     Returns:
         최종 답변
     """
-    messages = [
-        {
-            "role": "system",
-            "content": """당신은 유용한 AI 어시스턴트입니다. 
-사용자의 질문에 답하기 위해 필요한 도구를 사용할 수 있습니다.
-함수 실행 결과를 관찰한 후, 사용자에게 명확하고 도움이 되는 답변을 제공하세요."""
-        },
-        {
-            "role": "user",
-            "content": user_query
-        }
-    ]
+    context = ContextWindow(user_query, budget=context_budget)
     
-    max_iterations = 10  # 무한 루프 방지
+    executor = executor or tool_executor
+    client = client or get_client()
+    tools = registry.select(user_query, top_k)  # 대화 동안 같은 도구 묶음을 유지
+    max_iterations = MAX_ITERATIONS
     iteration = 0
     
     print(f"\n{'='*60}")
@@ -204,36 +1090,20 @@ def run_agent(user_query: str, model: str = "gemini-flash-latest") -> str:
     
     while iteration < max_iterations:
         iteration += 1
-        print(f"[반복 {iteration}] 모델에게 요청 전송...")
+        messages = context.request_messages()
+        print(f"[반복 {iteration}] 모델에게 요청 전송... (대화 기록 ~{context.total_tokens} 토큰)")
         
         # ──────────────────────────────────────────────────────────
         # [Step 1: Thought] 모델이 다음 행동을 계획
         # ──────────────────────────────────────────────────────────
         # 모델에게 요청 전송 - 모델은 현재 상황을 분석하고
         # 필요한 도구를 선택할지, 아니면 최종 답변을 할지 결정합니다
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            tools=FUNCTIONS_SCHEMA,  # 사용 가능한 도구 목록 제공
-            tool_choice="auto"  # 모델이 자동으로 도구 사용 결정
-        )
+        # 사용 가능한 도구 목록(미리 직렬화된 Schema)을 함께 보내고, 도구 사용은 모델이 자동 결정
+        response = create_completion(client, model, messages, tools)
         
         # 응답 확인
         assistant_message = response.choices[0].message
-        messages.append({
-            "role": "assistant",
-            "content": assistant_message.content,
-            "tool_calls": [
-                {
-                    "id": tc.id,
-                    "type": tc.type,
-                    "function": {
-                        "name": tc.function.name,
-                        "arguments": tc.function.arguments
-                    }
-                } for tc in (assistant_message.tool_calls or [])
-            ]
-        })
+        context.append(assistant_entry(assistant_message))
         
         # ──────────────────────────────────────────────────────────
         # [Final Answer 체크] 모델이 일반 텍스트로 답변한 경우
@@ -250,28 +1120,24 @@ def run_agent(user_query: str, model: str = "gemini-flash-latest") -> str:
         print(f"🔧 도구 호출 감지: {len(assistant_message.tool_calls)}개")
         
         for tool_call in assistant_message.tool_calls:
-            function_name = tool_call.function.name
-            function_args = json.loads(tool_call.function.arguments)
-            
-            print(f"  → 함수: {function_name}")
-            print(f"  → 인자: {function_args}")
-            
-            # 실제 함수 실행 (우리가 작성한 Python 코드 실행)
-            function_result = execute_function(function_name, function_args)
-            
-            print(f"  → 결과: {function_result[:100]}...")
+            print(f"  → 함수: {tool_call.function.name}")
+            print(f"  → 인자: {tool_call.function.arguments}")
+        
+        # 실제 함수 실행 (우리가 작성한 Python 코드 실행)
+        # 독립적인 호출은 동시에 실행 - 지연 시간은 가장 느린 호출 하나만큼
+        started = time.perf_counter()
+        function_results = executor.run(assistant_message.tool_calls)
+        print(f"  ⏱️  {len(function_results)}개 동시 실행: {time.perf_counter() - started:.2f}초")
+        
+        for tool_call, function_result in zip(assistant_message.tool_calls, function_results):
+            print(f"  → 결과 ({tool_call.function.name}): {function_result[:100]}...")
             
             # ──────────────────────────────────────────────────────────
             # [Step 3: Observation] 결과 피드백을 모델에게 전달
             # ──────────────────────────────────────────────────────────
-            # 함수 실행 결과를 다시 모델에게 던져줍니다
-            # 모델은 이 결과를 보고 다음 행동을 결정합니다
-            messages.append({
-                "role": "tool",
-                "tool_call_id": tool_call.id,
-                "name": function_name,
-                "content": function_result
-            })
+            # 함수 실행 결과를 다시 모델에게 던져줍니다 (원래 tool_call 순서 유지)
+            # 모델은 이 결과를 보고 다음 행동을 결정합니다 (너무 긴 결과는 잘라서 추가)
+            context.add_tool_result(tool_call, function_result)
         
         print()
     
@@ -279,6 +1145,602 @@ def run_agent(user_query: str, model: str = "gemini-flash-latest") -> str:
     return "최대 반복 횟수를 초과했습니다. 에이전트가 답변을 찾지 못했습니다."
 
 
+# ──────────────────────────────────────────────────────────
+# 스트리밍 루프 - 답변 토큰을 바로 보여주고, 도구는 인자가 완성되는 즉시 실행
+# ──────────────────────────────────────────────────────────
+# 스트리밍 응답에서 tool_calls의 arguments는 여러 조각으로 나뉘어 도착합니다.
+# 조각을 이어 붙이면서 JSON 객체가 닫히는 순간 그 도구를 스레드 풀에 제출하므로,
+# 모델이 다음 도구 호출을 생성하는 동안 앞의 도구가 이미 실행됩니다.
+
+class JsonObjectScanner:
+    """
+    조각으로 도착하는 JSON 객체가 닫혔는지 판별 (중괄호 깊이와 문자열 상태만 추적)
+    
+    조각마다 json.loads를 시도하면 인자가 길수록 제곱 비용이 들지만, 이 방식은 글자당 한 번만 봅니다.
+    """
+    
+    __slots__ = ("depth", "in_string", "escaped", "opened")
+    
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.opened = False
+    
+    def feed(self, fragment: str) -> bool:
+        """조각을 읽고, 최상위 객체가 닫혔으면 True"""
+        for ch in fragment:
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                self.depth += 1
+                self.opened = True
+            elif ch in "}]":
+                self.depth -= 1
+        return self.opened and self.depth == 0
+
+
+class _StreamedCall:
+    __slots__ = ("id", "name", "parts", "scanner", "args", "future", "started")
+    
+    def __init__(self):
+        self.id = ""
+        self.name = ""
+        self.parts: List[str] = []
+        self.scanner = JsonObjectScanner()
+        self.args: Any = None
+        self.future = None
+        self.started = 0.0
+    
+    @property
+    def arguments(self) -> str:
+        return "".join(self.parts)
+    
+    def as_tool_call(self) -> SimpleNamespace:
+        return SimpleNamespace(id=self.id, type="function",
+                               function=SimpleNamespace(name=self.name, arguments=self.arguments))
+
+
+class ToolCallAssembler:
+    """
+    스트리밍된 tool_calls 조각을 index별로 다시 조립하고, 인자가 완성된 도구부터 실행
+    
+    결과는 finish() 후 iter_results()에서 원래 tool_call 순서대로, 준비되는 대로 받습니다.
+    """
+    
+    def __init__(self, executor: ToolExecutor):
+        self.executor = executor
+        self.calls: Dict[int, _StreamedCall] = {}
+    
+    def feed(self, piece) -> Optional[str]:
+        """tool_call 조각 하나 반영 - 이번 조각으로 도구가 실행되기 시작했으면 그 이름"""
+        index = piece.index
+        if index is None:  # index를 주지 않는 호환 API - id가 오면 새 호출로 간주
+            index = len(self.calls) if piece.id or not self.calls else len(self.calls) - 1
+        call = self.calls.get(index)
+        if call is None:
+            call = self.calls[index] = _StreamedCall()
+        if piece.id:
+            call.id = piece.id
+        function = piece.function
+        if function is not None:
+            if function.name:
+                call.name += function.name
+            if function.arguments:
+                call.parts.append(function.arguments)
+                if call.future is None and call.scanner.feed(function.arguments):
+                    return self._start(call, final=False)
+        return None
+    
+    def _start(self, call: _StreamedCall, final: bool) -> Optional[str]:
+        _, _, args = parse_tool_call(call.as_tool_call())
+        if not isinstance(args, dict) and not final:
+            return None  # 아직 완전한 JSON이 아님 - 메시지가 끝날 때 다시 시도
+        call.args = args
+        call.started = time.monotonic()
+        call.future = self.executor.submit(call.name, args)
+        return call.name
+    
+    def finish(self) -> List[SimpleNamespace]:
+        """메시지가 끝났을 때 호출 - 아직 시작하지 않은 도구를 실행하고 tool_calls 목록을 반환"""
+        for call in self.calls.values():
+            if call.future is None and call.args is None:
+                self._start(call, final=True)
+        return [self.calls[i].as_tool_call() for i in sorted(self.calls)]
+    
+    def iter_results(self) -> Iterator[str]:
+        """결과를 원래 순서대로 하나씩 - 앞 도구가 끝나면 뒤 도구를 기다리지 않고 바로 yield"""
+        for _, call in sorted(self.calls.items()):
+            yield self.executor.result(call.name, call.args, call.future, call.started)
+    
+    def cancel(self):
+        """아직 시작하지 않은 도구를 취소 (이미 실행 중인 도구는 풀에서 끝나고 결과는 버려짐)"""
+        for call in self.calls.values():
+            if call.future is not None:
+                call.future.cancel()
+
+
+def stream_agent(user_query: str, model: str = "gemini-flash-latest",
+                 executor: Optional[ToolExecutor] = None, client=None,
+                 top_k: int = TOOL_TOP_K, context_budget: int = CONTEXT_TOKEN_BUDGET) -> Iterator[tuple]:
+    """
+    run_agent의 스트리밍 버전 - 진행 상황을 (종류, 값) 이벤트로 yield
+    
+    - ("text", 조각): 모델이 생성한 답변 텍스트 조각 (도착하는 대로)
+    - ("tool_start", 함수 이름): 인자 JSON이 완성되어 도구 실행을 시작함 (메시지가 끝나기 전일 수 있음)
+    - ("tool_result", (함수 이름, 결과 JSON)): 도구 결과 (원래 tool_call 순서)
+    - ("done", 최종 답변): 마지막 이벤트
+    """
+    context = ContextWindow(user_query, budget=context_budget)
+    executor = executor or tool_executor
+    client = client or get_client()
+    tools = registry.select(user_query, top_k)
+    
+    for _ in range(MAX_ITERATIONS):
+        assembler = ToolCallAssembler(executor)
+        text_parts: List[str] = []
+        # 소비자가 중간에 멈추면(break, close) 제출해 둔 도구를 정리
+        try:
+            for chunk in create_completion_stream(client, model, context.request_messages(), tools):
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    text_parts.append(delta.content)
+                    yield ("text", delta.content)
+                for piece in delta.tool_calls or ():
+                    started = assembler.feed(piece)
+                    if started:
+                        yield ("tool_start", started)
+            
+            tool_calls = assembler.finish()
+            content = "".join(text_parts) or None
+            context.append(assistant_entry(SimpleNamespace(content=content, tool_calls=tool_calls)))
+            if not tool_calls:
+                yield ("done", content or "답변을 생성할 수 없습니다.")
+                return
+            
+            for tool_call, function_result in zip(tool_calls, assembler.iter_results()):
+                yield ("tool_result", (tool_call.function.name, function_result))
+                context.add_tool_result(tool_call, function_result)
+        finally:
+            assembler.cancel()
+    
+    yield ("done", "최대 반복 횟수를 초과했습니다. 에이전트가 답변을 찾지 못했습니다.")
+
+
+def print_stream(user_query: str, **kwargs) -> str:
+    """stream_agent의 이벤트를 터미널에 바로 출력하고 최종 답변을 반환"""
+    print(f"\n🤖 {user_query}\n")
+    answer = ""
+    for kind, value in stream_agent(user_query, **kwargs):
+        if kind == "text":
+            print(value, end="", flush=True)
+        elif kind == "tool_start":
+            print(f"  🔧 {value} 실행 시작")
+        elif kind == "tool_result":
+            print(f"  → 결과 ({value[0]}): {value[1][:100]}")
+        else:
+            answer = value
+    print()
+    return answer
+
+
+# ──────────────────────────────────────────────────────────
+# 비동기 루프 - 하나의 이벤트 루프로 수백 개의 대화를 동시에 진행
+# ──────────────────────────────────────────────────────────
+# 모델 응답을 기다리는 동안 스레드를 붙잡지 않으므로,
+# 한 프로세스가 여러 대화를 번갈아 진행할 수 있습니다.
+# client는 `await client.chat.completions.create(...)`를 지원하는 객체면 무엇이든 됩니다
+# (AsyncOpenAI, 로컬 가짜 모델 서버에 연결한 AsyncOpenAI, StubAsyncClient 등).
+
+async def run_agent_async(user_query: str, model: str = "gemini-flash-latest",
+                          client=None, executor: Optional[ToolExecutor] = None,
+                          verbose: bool = True, top_k: int = TOOL_TOP_K,
+                          context_budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """run_agent의 비동기 버전 (동작과 대화 기록 형식은 동일)"""
+    context = ContextWindow(user_query, budget=context_budget)
+    client = client or get_async_client()
+    executor = executor or tool_executor
+    tools = registry.select(user_query, top_k)
+    
+    for iteration in range(1, MAX_ITERATIONS + 1):
+        if verbose:
+            print(f"[{user_query[:20]} | 반복 {iteration}] 모델에게 요청 전송...")
+        
+        response = await create_completion_async(client, model, context.request_messages(), tools)
+        assistant_message = response.choices[0].message
+        context.append(assistant_entry(assistant_message))
+        
+        if not assistant_message.tool_calls:
+            return assistant_message.content or "답변을 생성할 수 없습니다."
+        
+        # 도구는 스레드 풀에서 실행되고, 기다리는 동안 다른 대화가 진행됨
+        function_results = await executor.run_async(assistant_message.tool_calls)
+        for tool_call, function_result in zip(assistant_message.tool_calls, function_results):
+            if verbose:
+                print(f"  → {tool_call.function.name}: {function_result[:80]}")
+            context.add_tool_result(tool_call, function_result)
+    
+    return "최대 반복 횟수를 초과했습니다. 에이전트가 답변을 찾지 못했습니다."
+
+
+async def run_many(queries: List[str], concurrency: int = 32,
+                   model: str = "gemini-flash-latest", client=None,
+                   executor: Optional[ToolExecutor] = None) -> List[str]:
+    """
+    여러 질문을 하나의 이벤트 루프에서 동시에 처리 (최대 concurrency개씩)
+    
+    결과는 queries와 같은 순서이며, 실패한 대화는 오류 메시지 문자열로 채워집니다.
+    사용 예: answers = asyncio.run(run_many(questions, concurrency=100))
+    """
+    client = client or get_async_client()
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def one(query: str) -> str:
+        async with semaphore:
+            try:
+                return await run_agent_async(query, model, client, executor, verbose=False)
+            except Exception as e:
+                return f"오류: {type(e).__name__}: {e}"
+    
+    return list(await asyncio.gather(*(one(q) for q in queries)))
+
+
+class StubAsyncClient:
+    """
+    테스트·벤치마크용 in-process 모델 스텁 (AsyncOpenAI의 chat.completions.create 모양)
+    
+    첫 턴에는 질문 속 도시/종목으로 도구 호출을 만들고, 도구 결과를 받으면 최종 답변을 돌려줍니다.
+    latency 초만큼 기다려 네트워크 왕복을 흉내 냅니다.
+    """
+    
+    CITIES = {"서울": "Seoul", "도쿄": "Tokyo", "뉴욕": "New York"}
+    STOCKS = {"삼성": "005930", "애플": "AAPL", "테슬라": "TSLA"}
+    
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.requests = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+    
+    @staticmethod
+    def _tool_call(call_id: str, name: str, arguments: Dict[str, Any]):
+        return SimpleNamespace(
+            id=call_id, type="function",
+            function=SimpleNamespace(name=name, arguments=json.dumps(arguments, ensure_ascii=False)),
+        )
+    
+    async def _create(self, model: str, messages: List[Dict[str, Any]], **kwargs):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        
+        if messages[-1]["role"] == "tool":
+            observations = [m["content"] for m in messages if m["role"] == "tool"]
+            message = SimpleNamespace(content=f"도구 결과 {len(observations)}건: " + " / ".join(observations),
+                                      tool_calls=None)
+        else:
+            query = messages[-1]["content"]
+            calls = [self._tool_call(f"call_{i}", "get_weather", {"location": city})
+                     for i, (word, city) in enumerate(self.CITIES.items()) if word in query]
+            calls += [self._tool_call(f"call_s{i}", "get_stock_price", {"symbol": symbol})
+                      for i, (word, symbol) in enumerate(self.STOCKS.items()) if word in query]
+            message = SimpleNamespace(content=None if calls else "도구 없이 답변합니다.",
+                                      tool_calls=calls or None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class StubStreamClient:
+    """
+    스트리밍 테스트·벤치마크용 동기 모델 스텁 (OpenAI의 chat.completions.create 모양)
+    
+    StubAsyncClient와 같은 대화를 만들되, stream=True면 인자와 답변을 작은 조각으로 나눠
+    조각마다 delay초씩 기다리며 보냅니다. stream=False면 같은 시간을 기다린 뒤 한 번에 돌려줍니다.
+    """
+    
+    def __init__(self, delay: float = 0.01, fragment: int = 4):
+        self.delay = delay
+        self.fragment = fragment
+        self.returned_at: List[float] = []  # stream=False 응답이 반환된 시각 (perf_counter)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+    
+    def _plan(self, messages: List[Dict[str, Any]]) -> tuple:
+        """(답변 텍스트, [(id, 이름, 인자 JSON)])"""
+        if messages[-1]["role"] == "tool":
+            observations = [m["content"] for m in messages if m["role"] == "tool"]
+            return f"도구 결과 {len(observations)}건을 정리하면 " + " / ".join(observations), []
+        query = messages[-1]["content"]
+        calls = [(f"call_{i}", "get_weather", json.dumps({"location": city}))
+                 for i, (word, city) in enumerate(StubAsyncClient.CITIES.items()) if word in query]
+        calls += [(f"call_s{i}", "get_stock_price", json.dumps({"symbol": symbol}))
+                  for i, (word, symbol) in enumerate(StubAsyncClient.STOCKS.items()) if word in query]
+        return ("" if calls else "도구 없이 답변합니다."), calls
+    
+    def _chunks(self, text: str, calls: list) -> list:
+        step = self.fragment
+        chunks = [SimpleNamespace(content=text[i:i + step], tool_calls=None)
+                  for i in range(0, len(text), step)]
+        for index, (call_id, name, arguments) in enumerate(calls):
+            first = True
+            for i in range(0, len(arguments), step):
+                chunks.append(SimpleNamespace(content=None, tool_calls=[SimpleNamespace(
+                    index=index, id=call_id if first else None,
+                    function=SimpleNamespace(name=name if first else None, arguments=arguments[i:i + step]),
+                )]))
+                first = False
+        return chunks
+    
+    def _create(self, model: str, messages: List[Dict[str, Any]], stream: bool = False, **kwargs):
+        text, calls = self._plan(messages)
+        chunks = self._chunks(text, calls)
+        if not stream:
+            time.sleep(self.delay * len(chunks))
+            tool_calls = [SimpleNamespace(id=call_id, type="function",
+                                          function=SimpleNamespace(name=name, arguments=arguments))
+                          for call_id, name, arguments in calls]
+            message = SimpleNamespace(content=text or None, tool_calls=tool_calls or None)
+            self.returned_at.append(time.perf_counter())
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+        return self._stream(chunks)
+    
+    def _stream(self, chunks: list):
+        for delta in chunks:
+            time.sleep(self.delay)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+def stream_benchmark(delay: float = 0.01):
+    """첫 출력까지의 시간 - 완성된 응답을 기다리는 run_agent vs 스트리밍 stream_agent"""
+    query = "서울과 도쿄의 날씨를 비교하고 삼성 주가도 알려줘"
+    client = StubStreamClient(delay)
+    
+    blocking_started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        answer = run_agent(query, client=client)
+    blocking_total = time.perf_counter() - blocking_started
+    
+    firsts: Dict[str, float] = {}
+    started = time.perf_counter()
+    for kind, value in stream_agent(query, client=client):
+        firsts.setdefault(kind, time.perf_counter() - started)
+        if kind == "done":
+            assert value == answer
+    streaming_total = time.perf_counter() - started
+    
+    print(f"\n📊 스트리밍 - 조각당 {delay * 1000:.0f}ms (도구 3개 + 최종 답변)")
+    print(f"{'':<22} {'run_agent':>10} {'stream_agent':>13}")
+    print("-" * 48)
+    # run_agent는 첫 응답이 통째로 도착해야 도구를 실행하고, 답변은 마지막 응답과 함께 한 번에 나옴
+    print(f"{'첫 도구 실행 시작 (초)':<22} {client.returned_at[0] - blocking_started:>10.2f} "
+          f"{firsts['tool_start']:>13.2f}")
+    print(f"{'첫 답변 글자 (초)':<22} {blocking_total:>10.2f} {firsts['text']:>13.2f}")
+    print(f"{'전체 (초)':<22} {blocking_total:>10.2f} {streaming_total:>13.2f}")
+
+
+def calc_benchmark(repeat: int = 20000, rows: int = 100_000):
+    """수식 엔진 vs eval - 반복 계산과 변수 바인딩 배열 계산"""
+    namespace = {"__builtins__": {}, "math": math, **SAFE_FUNCTIONS, **SAFE_CONSTANTS}
+    expressions = ["175.5 * 10", "2 ** 10 + sqrt(16)", "(75000 - 74100) / 74100 * 100",
+                   "round(math.pi * 3 ** 2, 2)"]
+    print(f"\n📊 수식 계산 - 같은 수식 {repeat}회 반복 (µs/회)")
+    print(f"{'수식':<32} {'eval':>8} {'엔진':>8} {'배속':>8}")
+    print("-" * 60)
+    for expression in expressions:
+        assert safe_eval(expression) == eval(expression, namespace)
+        baseline = _per_call_us(lambda: eval(expression, namespace), repeat)
+        fast = _per_call_us(lambda: safe_eval(expression), repeat)
+        print(f"{expression:<32} {baseline:>8.2f} {fast:>8.2f} {baseline / fast:>7.1f}x")
+    
+    expression = "price * (1 + rate) ** years - fee"
+    columns = {"price": [100 + i % 50 for i in range(rows)], "rate": [0.01 * (i % 7) for i in range(rows)],
+               "years": [i % 10 for i in range(rows)], "fee": [1.5] * rows}
+    bindings = [dict(zip(columns, values)) for values in zip(*columns.values())]
+    code = compile(expression, "<expr>", "eval")
+    
+    started = time.perf_counter()
+    expected = [eval(expression, namespace, env) for env in bindings]
+    eval_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    precompiled = [eval(code, namespace, env) for env in bindings]
+    code_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    results = compile_expression(expression).evaluate_many(bindings)
+    engine_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    by_column = compile_expression(expression).evaluate_many(columns)
+    column_ms = (time.perf_counter() - started) * 1000
+    assert results == by_column == expected == precompiled
+    print(f"\n📊 '{expression}' - 바인딩 {rows:,}개 (ms)")
+    print(f"  eval(문자열)                {eval_ms:>8.1f}")
+    print(f"  eval(미리 컴파일한 코드)*   {code_ms:>8.1f}")
+    print(f"  evaluate_many(dict 목록)    {engine_ms:>8.1f}")
+    print(f"  evaluate_many(변수별 목록)  {column_ms:>8.1f}")
+    print("  * 안전 검사 없이 임의 코드를 실행하므로 참고용")
+
+
+def run_many_benchmark(count: int = 200, latency: float = 0.05):
+    """StubAsyncClient로 동시성별 대화 처리량 측정 (API 키 불필요)"""
+    queries = [["서울과 도쿄의 날씨를 비교해줘", "애플 주가 알려줘", "삼성 주가와 뉴욕 날씨"][i % 3]
+               for i in range(count)]
+    print(f"\n📊 run_many — 대화 {count}개, 모델 지연 {latency * 1000:.0f}ms/요청 (대화당 2회 요청)")
+    print(f"{'동시성':>8} {'대화 수':>8} {'초':>8} {'대화/초':>10} {'요청 수':>8}")
+    print("-" * 48)
+    for concurrency in (1, 10, 50, 200):
+        if concurrency == 1:
+            sample = queries[:20]   # 순차 실행은 느리므로 일부만 측정해 환산
+        else:
+            sample = queries
+        stub = StubAsyncClient(latency)
+        started = time.perf_counter()
+        answers = asyncio.run(run_many(sample, concurrency=concurrency, client=stub))
+        elapsed = time.perf_counter() - started
+        assert len(answers) == len(sample) and not any(a.startswith("오류") for a in answers)
+        print(f"{concurrency:>8} {len(sample):>8} {elapsed:>8.2f} {len(sample) / elapsed:>10.1f} "
+              f"{stub.requests:>8}")
+    print_cache_stats()
+
+
+SYNTHETIC_TOPICS = [
+    ("주가", "stock price quote market"), ("날씨", "weather forecast temperature"),
+    ("환율", "currency exchange rate"), ("뉴스", "news headline article"),
+    ("일정", "calendar schedule meeting"), ("메일", "email inbox message"),
+    ("번역", "translate language text"), ("지도", "map route distance"),
+    ("항공편", "flight airline booking"), ("호텔", "hotel room reservation"),
+    ("주문", "order shipping delivery"), ("결제", "payment invoice billing"),
+    ("재고", "inventory stock warehouse"), ("고객", "customer account profile"),
+    ("로그", "log error monitoring"), ("배포", "deploy release build"),
+    ("데이터베이스", "database query table"), ("파일", "file storage upload"),
+    ("이미지", "image photo resize"), ("음악", "music playlist song"),
+]
+SYNTHETIC_ACTIONS = [("조회", "get"), ("검색", "search"), ("생성", "create"),
+                     ("수정", "update"), ("삭제", "delete"), ("요약", "summarize"), ("분석", "analyze")]
+
+
+def _synthetic_tool(index: int) -> Callable:
+    def tool_fn(query: str, limit: int = 10, exact: bool = False) -> Dict[str, Any]:
+        return {"tool": index, "query": query, "limit": limit}
+    return tool_fn
+
+
+def synthetic_registry(count: int) -> ToolRegistry:
+    """벤치마크용 가짜 도구 count개 (주제 × 동작 조합으로 서로 다른 이름과 설명)"""
+    synthetic = ToolRegistry()
+    for i in range(count):
+        (topic, topic_en), (action, action_en) = (SYNTHETIC_TOPICS[i % len(SYNTHETIC_TOPICS)],
+                                                  SYNTHETIC_ACTIONS[(i // len(SYNTHETIC_TOPICS)) % len(SYNTHETIC_ACTIONS)])
+        synthetic.register(
+            _synthetic_tool(i),
+            description=f"{topic} {action} 도구 #{i}. {topic_en} {action_en} 작업을 수행합니다.",
+            params={"query": f"{topic} {action} 대상", "limit": "최대 결과 수", "exact": "정확히 일치하는 항목만"},
+            name=f"{action_en}_{topic_en.split()[0]}_{i}",
+        )
+    return synthetic.freeze()
+
+
+def _per_call_us(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def schema_benchmark():
+    """요청 생성 비용 비교 - tools를 매번 직렬화 vs 미리 직렬화한 바이트 재사용"""
+    messages = initial_messages("서울과 도쿄의 날씨를 비교하고 애플 주가도 알려줘")
+    messages += [
+        {"role": "assistant", "content": None, "tool_calls": [
+            {"id": f"call_{i}", "type": "function",
+             "function": {"name": "get_weather", "arguments": json.dumps({"location": city})}}
+            for i, city in enumerate(["Seoul", "Tokyo"])]},
+        *({"role": "tool", "tool_call_id": f"call_{i}", "name": "get_weather",
+           "content": execute_function("get_weather", {"location": city})}
+          for i, city in enumerate(["Seoul", "Tokyo"])),
+    ]
+    model = "gemini-flash-latest"
+    
+    print(f"\n📊 요청 본문 생성 (메시지 {len(messages)}개)")
+    print(f"{'도구 수':>8} {'본문 KB':>10} {'매번 직렬화 µs':>16} {'사전 직렬화 µs':>16} {'배속':>8}")
+    print("-" * 64)
+    for count in (10, 100, 1000):
+        tools = synthetic_registry(count)
+        schemas = tools.schemas
+        repeat = max(20, 20000 // count)
+        
+        def every_time():
+            return json.dumps({"model": model, "messages": messages, "tools": schemas,
+                               "tool_choice": "auto"}, ensure_ascii=False, separators=(",", ":")).encode()
+        
+        def prebuilt():
+            return request_body(model, messages, tools)
+        
+        assert json.loads(every_time()) == json.loads(prebuilt())
+        baseline = _per_call_us(every_time, repeat)
+        fast = _per_call_us(prebuilt, repeat)
+        print(f"{count:>8} {len(prebuilt()) / 1024:>10.1f} {baseline:>16.1f} {fast:>16.1f} "
+              f"{baseline / fast:>7.1f}x")
+
+
+def tool_selection_benchmark(top_k: int = TOOL_TOP_K):
+    """도구 수별 BM25 색인·선택 시간과 프롬프트(tools) 크기 비교"""
+    # 질문마다 정답 (주제, 동작) - 고른 도구 중 하나라도 맞으면 적중 (정답 도구가 있는 질문만 집계)
+    cases = [
+        ("내일 부산 날씨 예보 좀 알려줘", "weather", "get"),
+        ("지난달 결제 청구서를 요약해줘", "payment", "summarize"),
+        ("배포 로그에서 에러를 분석해줘", "log", "analyze"),
+        ("다음 주 회의 일정을 새로 만들어줘", "calendar", "create"),
+        ("서울 근처 호텔을 검색해줘", "hotel", "search"),
+        ("고객 계정 정보를 수정해야 해", "customer", "update"),
+        ("오래된 이미지 파일을 삭제해줘", "image", "delete"),
+        ("달러 환율 조회", "currency", "get"),
+    ]
+    print(f"\n📊 도구 선택 (top_k={top_k}, 질문 {len(cases)}개)")
+    print(f"{'도구 수':>8} {'색인 ms':>9} {'선택 µs':>9} {'전체 KB':>9} {'선택 KB':>9} "
+          f"{'감소':>7} {'적중':>6}")
+    print("-" * 66)
+    for count in (10, 100, 1000, 5000):
+        tools = synthetic_registry(count)
+        started = time.perf_counter()
+        tools.index
+        build_ms = (time.perf_counter() - started) * 1000
+        
+        repeat = 200
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for query, _, _ in cases:
+                tools.select(query, top_k)
+        select_us = (time.perf_counter() - started) / (repeat * len(cases)) * 1e6
+        
+        selected_bytes = 0
+        hits = answerable = 0
+        for query, topic, action in cases:
+            selection = tools.select(query, top_k)
+            selected_bytes += len(selection.schemas_json)
+            prefix = f"{action}_{topic}_"
+            if any(name.startswith(prefix) for name in tools.functions):
+                answerable += 1
+                hits += any(schema["function"]["name"].startswith(prefix) for schema in selection.schemas)
+        full_kb = len(tools.schemas_json) / 1024
+        selected_kb = selected_bytes / len(cases) / 1024
+        print(f"{count:>8} {build_ms:>9.1f} {select_us:>9.1f} {full_kb:>9.1f} {selected_kb:>9.1f} "
+              f"{full_kb / selected_kb:>6.1f}x {hits:>3}/{answerable}")
+
+
+def context_benchmark(turns: int = 50, result_chars: int = 1500):
+    """긴 대화 시뮬레이션 - 압축 유무에 따른 턴별 요청 크기와 누적 전송량"""
+    observation = json.dumps({"rows": ["x" * 40] * (result_chars // 48)})
+    
+    def simulate(budget: float) -> List[int]:
+        context = ContextWindow("지난 분기 매출 데이터를 단계별로 분석해줘", budget=budget)
+        sizes = []
+        for turn in range(turns):
+            sizes.append(len(request_body("gemini-flash-latest", context.request_messages())))
+            calls = [SimpleNamespace(id=f"call_{turn}_{i}", type="function",
+                                     function=SimpleNamespace(name="get_weather",
+                                                              arguments=json.dumps({"location": "Seoul"})))
+                     for i in range(2)]
+            context.append(assistant_entry(SimpleNamespace(content=f"{turn}단계 분석 중", tool_calls=calls)))
+            for call in calls:
+                context.add_tool_result(call, observation)
+        return sizes
+    
+    full = simulate(float("inf"))
+    compacted = simulate(CONTEXT_TOKEN_BUDGET)
+    tools_kb = len(registry.schemas_json) / 1024
+    print(f"\n📊 대화 기록 압축 - {turns}턴, 턴마다 도구 결과 2개 × {len(observation)}자 "
+          f"(예산 {CONTEXT_TOKEN_BUDGET} 토큰, tools {tools_kb:.1f} KB 포함)")
+    print(f"{'턴':>6} {'압축 없음 KB':>14} {'압축 KB':>10}")
+    print("-" * 34)
+    for turn in sorted({1, 5, 10, 20, turns // 2, turns}):
+        print(f"{turn:>6} {full[turn - 1] / 1024:>14.1f} {compacted[turn - 1] / 1024:>10.1f}")
+    print(f"{'누적':>6} {sum(full) / 1024:>14.1f} {sum(compacted) / 1024:>10.1f}")
+
+
 # ============================================================================
 # [3단계: MCP로의 연결 - 표준화의 필요성]
 # ============================================================================
@@ -292,6 +1754,25 @@ def run_agent(user_query: str, model: str = "gemini-flash-latest") -> str:
 # ============================================================================
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench-many":
+        run_many_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 200)
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench-schema":
+        schema_benchmark()
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench-calc":
+        calc_benchmark()
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench-stream":
+        stream_benchmark()
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench-context":
+        context_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 50)
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench-tools":
+        tool_selection_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else TOOL_TOP_K)
+        sys.exit(0)
+    
     gemini_api_key = os.getenv("GEMINI_API_KEY")
     if not gemini_api_key or gemini_api_key == "your-gemini-api-key-here":
         print("❌ 오류: GEMINI_API_KEY가 설정되지 않았습니다.")
@@ -317,9 +1798,12 @@ if __name__ == "__main__":
     
     print("\n" + "-"*60)
     
+    # --stream: 답변을 토큰 단위로 바로 출력 (도구는 인자가 완성되는 즉시 실행)
+    agent = print_stream if "--stream" in sys.argv else run_agent
+    
     # 첫 번째 예제 실행
     query = examples[0]
-    result = run_agent(query)
+    result = agent(query)
     
     print(f"\n💬 최종 답변:\n{result}\n")
     
@@ -334,7 +1818,7 @@ if __name__ == "__main__":
             if not user_input:
                 break
             
-            result = run_agent(user_input)
+            result = agent(user_input)
             print(f"\n💬 최종 답변:\n{result}\n")
             print("-"*60 + "\n")
     except KeyboardInterrupt:
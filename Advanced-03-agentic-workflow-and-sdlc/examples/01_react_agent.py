@@ -7,11 +7,20 @@ LLM이 도구를 사용하여 문제를 해결하는 기본 Agent 루프를 구
 필요: pip install anthropic python-dotenv
 """
 
+import ast
+import asyncio
+import functools
+import inspect
 import json
 import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime
+from typing import Callable
 
-from anthropic import Anthropic
+from anthropic import Anthropic, APIConnectionError, APIError, APIStatusError
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -19,55 +28,286 @@ load_dotenv()
 client = Anthropic()
 
 # ============================================================
-# 1단계: 도구 정의
+# 1단계: 도구 레지스트리
 # ============================================================
-tools = [
-    {
-        "name": "calculator",
-        "description": "수학 계산을 수행합니다. 사칙연산, 거듭제곱, 제곱근 등을 지원합니다.",
-        "input_schema": {
-            "type": "object",
-            "properties": {
-                "expression": {
-                    "type": "string",
-                    "description": "계산할 수학 표현식 (예: '2 + 3 * 4', 'sqrt(16)', '2**10')",
-                }
-            },
-            "required": ["expression"],
-        },
-    },
-    {
-        "name": "get_current_time",
-        "description": "현재 날짜와 시간을 반환합니다.",
-        "input_schema": {
-            "type": "object",
-            "properties": {
-                "timezone": {
-                    "type": "string",
-                    "description": "시간대 (예: 'KST', 'UTC'). 기본값은 KST입니다.",
-                }
-            },
-        },
-    },
-    {
-        "name": "get_weather",
-        "description": "도시의 현재 날씨를 조회합니다. (Mock 데이터)",
-        "input_schema": {
-            "type": "object",
-            "properties": {
-                "city": {
-                    "type": "string",
-                    "description": "도시명 (예: '서울', '부산', '제주')",
-                }
-            },
-            "required": ["city"],
-        },
-    },
-]
+# 도구 이름 → (스키마, 실행 함수)를 한곳에 등록합니다.
+# 호출은 dict 조회 한 번(O(1))이고, 한 응답의 여러 tool_use는 동시에 실행되며
+# 결과는 tool_use 순서 그대로 돌려줍니다.
+CACHE_CONTROL = {"type": "ephemeral"}  # 프롬프트 캐시 지점 표시
+
+# 동기 핸들러용 스레드 풀 - asyncio.run이 끝날 때 기다리는 루프 기본 실행기 대신
+# 프로세스 내내 유지되는 풀을 써서, 시간 초과된 도구가 run()을 붙잡지 않게 함
+TOOL_THREADS = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tool")
+
+
+@dataclass
+class Tool:
+    name: str
+    description: str
+    input_schema: dict
+    handler: Callable
+    max_concurrency: int | None = None  # 동시에 실행할 수 있는 최대 개수 (None이면 제한 없음)
+    timeout: float | None = None  # 이 도구의 실행 시간 제한(초) - 호출 시 지정한 값과 작은 쪽 적용
+    # 프로세스 전체에서 공유하는 실행 슬롯 - 이벤트 루프·run_agent 호출이 달라도 같은 제한
+    slots: threading.BoundedSemaphore | None = field(default=None, init=False, repr=False)
+
+    def __post_init__(self):
+        if self.max_concurrency is not None:
+            self.slots = threading.BoundedSemaphore(self.max_concurrency)
+
+    @property
+    def schema(self) -> dict:
+        return {"name": self.name, "description": self.description, "input_schema": self.input_schema}
+
+
+class ToolRegistry:
+    """도구 등록과 실행 - 동기/비동기 핸들러 모두 지원합니다."""
+
+    def __init__(self):
+        self._tools: dict[str, Tool] = {}
+        self._schemas: list[dict] | None = None
+        self._cached_schemas: list[dict] | None = None
+
+    def tool(
+        self,
+        name: str,
+        description: str,
+        input_schema: dict,
+        max_concurrency: int | None = None,
+        timeout: float | None = None,
+    ):
+        """도구 등록 데코레이터. 핸들러는 tool_input의 키를 키워드 인자로 받습니다."""
+
+        def decorator(handler: Callable) -> Callable:
+            if name in self._tools:
+                raise ValueError(f"이미 등록된 도구: {name}")
+            self._tools[name] = Tool(name, description, input_schema, handler, max_concurrency, timeout)
+            self._schemas = self._cached_schemas = None
+            return handler
+
+        return decorator
+
+    @property
+    def schemas(self) -> list[dict]:
+        """API의 tools 인자로 넘길 스키마 목록"""
+        if self._schemas is None:
+            self._schemas = [tool.schema for tool in self._tools.values()]
+        return self._schemas
+
+    @property
+    def cached_schemas(self) -> list[dict]:
+        """마지막 도구에 cache_control을 단 스키마 목록 (도구 정의 전체가 캐시 접두사가 됨)"""
+        if self._cached_schemas is None:
+            schemas = self.schemas
+            self._cached_schemas = [*schemas[:-1], {**schemas[-1], "cache_control": CACHE_CONTROL}] if schemas else []
+        return self._cached_schemas
+
+    @staticmethod
+    async def _acquire(slots: threading.BoundedSemaphore):
+        """이벤트 루프를 막지 않고 슬롯 획득 (취소되어도 슬롯을 잡은 채 남지 않도록 폴링)"""
+        delay = 0.001
+        while not slots.acquire(blocking=False):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+    async def _execute(self, tool: Tool, tool_input: dict) -> str:
+        slots = tool.slots
+        if inspect.iscoroutinefunction(tool.handler):
+            if slots is not None:
+                await self._acquire(slots)
+            try:
+                return str(await tool.handler(**tool_input))
+            finally:
+                if slots is not None:
+                    slots.release()
+
+        # 동기 핸들러는 스레드에서 실행해 다른 도구를 막지 않음
+        # 시간 초과로 기다림을 그만둬도 스레드는 계속 돌므로, 슬롯은 핸들러가 실제로 끝날 때 반납
+        def run_and_release():
+            try:
+                return tool.handler(**tool_input)
+            finally:
+                if slots is not None:
+                    slots.release()
+
+        if slots is not None:
+            await self._acquire(slots)
+        loop = asyncio.get_running_loop()
+        return str(await loop.run_in_executor(TOOL_THREADS, run_and_release))
+
+    async def call(
+        self,
+        name: str,
+        tool_input: dict,
+        timeout: float | None = None,
+        latencies: dict[str, list[float]] | None = None,
+    ) -> tuple[str, bool]:
+        """
+        도구 하나 실행 → (결과 문자열, 오류 여부)
+
+        timeout(초)을 넘기면 오류 결과를 돌려줍니다. (동기 핸들러의 스레드는 멈출 수 없어 TOOL_THREADS에서 계속 실행되지만 기다리지 않음)
+        latencies를 넘기면 도구 이름별 실행 시간을 기록합니다.
+        """
+        print(f"  🔧 도구 실행: {name}({json.dumps(tool_input, ensure_ascii=False)})")
+        tool = self._tools.get(name)
+        if tool is None:
+            return f"알 수 없는 도구: {name}", True
+
+        limits = [t for t in (tool.timeout, timeout) if t is not None]
+        limit = min(limits) if limits else None
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(self._execute(tool, tool_input), limit), False
+        except asyncio.TimeoutError:
+            return f"도구 시간 초과 ({name}, {limit:g}초)", True
+        except Exception as e:
+            return f"도구 오류 ({name}): {e}", True
+        finally:
+            if latencies is not None:
+                latencies.setdefault(name, []).append(time.perf_counter() - started)
+
+    async def run_all(
+        self,
+        tool_uses: list,
+        timeout: float | None = None,
+        latencies: dict[str, list[float]] | None = None,
+    ) -> list[dict]:
+        """여러 tool_use 블록을 동시에 실행하고 tool_result 블록을 같은 순서로 반환"""
+        outcomes = await asyncio.gather(*(self.call(t.name, t.input, timeout, latencies) for t in tool_uses))
+        results = []
+        for tool_use, (content, is_error) in zip(tool_uses, outcomes):
+            block = {"type": "tool_result", "tool_use_id": tool_use.id, "content": content}
+            if is_error:
+                block["is_error"] = True
+            results.append(block)
+        return results
+
+    def run(
+        self,
+        tool_uses: list,
+        timeout: float | None = None,
+        latencies: dict[str, list[float]] | None = None,
+    ) -> list[dict]:
+        """run_all의 동기 버전 (이미 이벤트 루프가 도는 Jupyter 등에서도 호출 가능)"""
+        return run_sync(self.run_all(tool_uses, timeout, latencies))
+
+
+def run_sync(coro):
+    """
+    코루틴을 끝까지 실행해 결과를 반환합니다.
+
+    이 스레드에서 이벤트 루프가 이미 돌고 있으면(Jupyter, async 함수 안) asyncio.run을 쓸 수 없으므로
+    별도 스레드의 새 루프에서 실행하고 끝날 때까지 기다립니다.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="tool-loop") as runner:
+        return runner.submit(asyncio.run, coro).result()
+
+
+registry = ToolRegistry()
+
 
 # ============================================================
-# 2단계: 도구 실행 함수
+# 2단계: 도구 정의 & 실행 함수
 # ============================================================
+# 계산기: eval 대신 산술 전용 수식 엔진
+# 수식을 한 번 파싱해 산술 연산과 허용된 수학 함수만 있는지 검사한 뒤
+# 바이트코드로 컴파일하고, 같은 수식은 캐시에서 꺼내 씁니다.
+MAX_POWER_BITS = 100_000  # 9**9**9 같은 거대한 거듭제곱 차단
+
+
+def _safe_pow(base, exponent):
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0 and abs(base) > 1:
+        if exponent * abs(base).bit_length() > MAX_POWER_BITS:
+            raise ValueError("거듭제곱 결과가 너무 큽니다.")
+    return base**exponent
+
+
+SAFE_FUNCTIONS = {
+    "sqrt": math.sqrt,
+    "abs": abs,
+    "round": round,
+    "pow": _safe_pow,
+    "min": min,
+    "max": max,
+    **{
+        name: getattr(math, name)
+        for name in ("exp", "log", "log2", "log10", "sin", "cos", "tan", "floor", "ceil")
+    },
+}
+SAFE_CONSTANTS = {"pi": math.pi, "e": math.e}
+ARITHMETIC_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.UAdd, ast.USub)
+
+
+class ArithmeticOnly(ast.NodeTransformer):
+    """숫자, 사칙연산·거듭제곱, 허용된 함수/상수(math.* 포함)만 통과시킵니다."""
+
+    def generic_visit(self, node):
+        raise ValueError(f"허용되지 않는 구문: {type(node).__name__}")
+
+    def visit_Expression(self, node):
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_Constant(self, node):
+        if type(node.value) not in (int, float):
+            raise ValueError(f"숫자가 아닌 값: {node.value!r}")
+        return node
+
+    def visit_Name(self, node):
+        if node.id not in SAFE_CONSTANTS:
+            raise ValueError(f"알 수 없는 이름: {node.id}")
+        return node
+
+    def visit_Attribute(self, node):  # math.pi
+        if isinstance(node.value, ast.Name) and node.value.id == "math" and node.attr in SAFE_CONSTANTS:
+            return ast.copy_location(ast.Name(node.attr, ast.Load()), node)
+        raise ValueError(f"허용되지 않는 속성 접근: {ast.unparse(node)}")
+
+    def visit_Call(self, node):  # sqrt(16), math.sqrt(16)
+        func = node.func
+        if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == "math":
+            name = func.attr
+        elif isinstance(func, ast.Name):
+            name = func.id
+        else:
+            raise ValueError(f"허용되지 않는 호출: {ast.unparse(func)}")
+        if name not in SAFE_FUNCTIONS or node.keywords:
+            raise ValueError(f"허용되지 않는 함수 호출: {ast.unparse(node)}")
+        node.func = ast.copy_location(ast.Name(name, ast.Load()), func)
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+    def visit_BinOp(self, node):
+        if not isinstance(node.op, ARITHMETIC_OPS):
+            raise ValueError(f"허용되지 않는 연산자: {type(node.op).__name__}")
+        left, right = self.visit(node.left), self.visit(node.right)
+        if isinstance(node.op, ast.Pow):  # a ** b → pow(a, b) (크기 제한)
+            return ast.copy_location(ast.Call(ast.Name("pow", ast.Load()), [left, right], []), node)
+        node.left, node.right = left, right
+        return node
+
+    def visit_UnaryOp(self, node):
+        if not isinstance(node.op, ARITHMETIC_OPS):
+            raise ValueError(f"허용되지 않는 연산자: {type(node.op).__name__}")
+        node.operand = self.visit(node.operand)
+        return node
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_expression(expression: str):
+    """수식을 검증·컴파일해 인자 없는 함수로 반환합니다. (수식 문자열 단위로 캐시)"""
+    if len(expression) > 1000:
+        raise ValueError("수식이 너무 깁니다.")
+    tree = ArithmeticOnly().visit(ast.parse(expression.strip(), mode="eval"))
+    code = compile(ast.fix_missing_locations(tree), "<expression>", "eval")
+    namespace = {"__builtins__": {}, **SAFE_FUNCTIONS, **SAFE_CONSTANTS}
+    return lambda: eval(code, namespace)  # 검증된 산술 트리만 실행
+
+
 WEATHER_DATA = {
     "서울": {"temp": -2, "condition": "맑음", "humidity": 35},
     "부산": {"temp": 5, "condition": "흐림", "humidity": 60},
@@ -76,67 +316,331 @@ WEATHER_DATA = {
 }
 
 
+@registry.tool(
+    name="calculator",
+    description="수학 계산을 수행합니다. 사칙연산, 거듭제곱, 제곱근 등을 지원합니다.",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "expression": {
+                "type": "string",
+                "description": "계산할 수학 표현식 (예: '2 + 3 * 4', 'sqrt(16)', '2**10')",
+            }
+        },
+        "required": ["expression"],
+    },
+)
+def calculator(expression: str) -> str:
+    try:
+        result = compile_expression(expression)()
+        return f"계산 결과: {result}"
+    except Exception as e:
+        return f"계산 오류: {e}"
+
+
+@registry.tool(
+    name="get_current_time",
+    description="현재 날짜와 시간을 반환합니다.",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "timezone": {
+                "type": "string",
+                "description": "시간대 (예: 'KST', 'UTC'). 기본값은 KST입니다.",
+            }
+        },
+    },
+)
+def get_current_time(timezone: str = "KST") -> str:
+    now = datetime.now()
+    return f"현재 시간: {now.strftime('%Y-%m-%d %H:%M:%S')} (KST)"
+
+
+@registry.tool(
+    name="get_weather",
+    description="도시의 현재 날씨를 조회합니다. (Mock 데이터)",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "city": {
+                "type": "string",
+                "description": "도시명 (예: '서울', '부산', '제주')",
+            }
+        },
+        "required": ["city"],
+    },
+    max_concurrency=2,  # 외부 날씨 API의 동시 요청 제한을 흉내
+)
+async def get_weather(city: str) -> str:
+    await asyncio.sleep(0.2)  # 외부 API 호출 지연 흉내 (Mock)
+    weather = WEATHER_DATA.get(city)
+    if weather:
+        return f"{city} 날씨: {weather['condition']}, 기온 {weather['temp']}°C, 습도 {weather['humidity']}%"
+    return f"{city}의 날씨 정보를 찾을 수 없습니다. 지원 도시: {', '.join(WEATHER_DATA.keys())}"
+
+
+# API에 넘길 도구 목록 (레지스트리에서 생성)
+tools = registry.schemas
+
+
 def execute_tool(name: str, tool_input: dict) -> str:
-    """도구를 실행하고 결과를 반환합니다."""
-    print(f"  🔧 도구 실행: {name}({json.dumps(tool_input, ensure_ascii=False)})")
+    """도구 하나를 실행하고 결과를 반환합니다."""
+    content, _ = run_sync(registry.call(name, tool_input))
+    return content
 
-    if name == "calculator":
-        expr = tool_input["expression"]
-        # 안전한 수학 함수만 허용
-        allowed = {"sqrt": math.sqrt, "abs": abs, "round": round, "pow": pow}
-        try:
-            result = eval(expr, {"__builtins__": {}, "math": math, **allowed})
-            return f"계산 결과: {result}"
-        except Exception as e:
-            return f"계산 오류: {e}"
 
-    elif name == "get_current_time":
-        now = datetime.now()
-        return f"현재 시간: {now.strftime('%Y-%m-%d %H:%M:%S')} (KST)"
+# ============================================================
+# 요청 생성: 프롬프트 캐시 활용
+# ============================================================
+# 매 턴 보내는 요청은 [도구 정의 → 시스템 프롬프트 → 이전 대화] 순서의 접두사가 같습니다.
+# 이 경계에 cache_control을 달아 두면 다음 턴에서 그 부분을 캐시에서 읽어
+# 입력 비용과 첫 토큰까지의 시간이 줄어듭니다. (캐시 지점은 요청당 최대 4개,
+# 모델별 최소 길이(예: 1024 토큰)보다 짧은 접두사는 캐시되지 않습니다.)
+MODEL = "claude-sonnet-4-5-20250929"
+
+SYSTEM_PROMPT = """당신은 도구를 사용해 문제를 단계적으로 해결하는 어시스턴트입니다.
+필요한 정보는 추측하지 말고 도구로 확인하세요.
+서로 독립적인 도구 호출은 한 번의 응답에서 함께 요청하세요."""
+
+
+def _with_cache_control(block) -> dict:
+    if isinstance(block, str):
+        return {"type": "text", "text": block, "cache_control": CACHE_CONTROL}
+    if not isinstance(block, dict):  # SDK 응답 블록 (assistant 메시지)
+        block = block.model_dump(exclude_none=True)
+    return {**block, "cache_control": CACHE_CONTROL}
+
+
+def build_request(messages: list, system: str | None = SYSTEM_PROMPT, max_tokens: int = 1024) -> dict:
+    """
+    messages.create 인자를 만듭니다. 캐시 지점 3곳:
+    도구 정의의 끝, 시스템 프롬프트의 끝, 마지막 메시지의 끝(지금까지의 대화 전체).
+
+    대화 기록(messages)은 수정하지 않고, 마지막 메시지만 복사해 표시합니다.
+    """
+    request = {"model": MODEL, "max_tokens": max_tokens, "tools": registry.cached_schemas}
+    if system:
+        request["system"] = [_with_cache_control(system)]
+    if messages:
+        last = messages[-1]
+        content = last["content"]
+        blocks = [content] if isinstance(content, str) else list(content)
+        blocks[-1] = _with_cache_control(blocks[-1])
+        messages = [*messages[:-1], {**last, "content": blocks}]
+    request["messages"] = messages
+    return request
+
+
+@dataclass
+class Usage:
+    """response.usage 누적 (input_tokens에는 캐시에서 읽거나 캐시에 쓴 토큰이 포함되지 않음)"""
+
+    TOKEN_FIELDS = ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens")
 
-    elif name == "get_weather":
-        city = tool_input["city"]
-        weather = WEATHER_DATA.get(city)
-        if weather:
-            return f"{city} 날씨: {weather['condition']}, 기온 {weather['temp']}°C, 습도 {weather['humidity']}%"
-        return f"{city}의 날씨 정보를 찾을 수 없습니다. 지원 도시: {', '.join(WEATHER_DATA.keys())}"
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_input_tokens: int = 0
+    cache_creation_input_tokens: int = 0
+    last: "Usage | None" = field(default=None, repr=False, compare=False)  # 마지막으로 더한 응답 하나의 Usage
 
-    return f"알 수 없는 도구: {name}"
+    def add(self, usage) -> "Usage":
+        """한 번의 응답 usage를 더하고, 그 응답만의 Usage를 반환 (self.last에도 보관)"""
+        call = Usage(**{name: getattr(usage, name, 0) or 0 for name in self.TOKEN_FIELDS})
+        for name in self.TOKEN_FIELDS:
+            setattr(self, name, getattr(self, name) + getattr(call, name))
+        self.last = call
+        return call
+
+    @property
+    def total(self) -> int:
+        """처리된 전체 토큰 (캐시 포함)"""
+        return sum(getattr(self, name) for name in self.TOKEN_FIELDS)
+
+    @property
+    def cache_hit_rate(self) -> float:
+        total = self.input_tokens + self.cache_read_input_tokens + self.cache_creation_input_tokens
+        return self.cache_read_input_tokens / total if total else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"입력 {self.input_tokens} · 캐시 읽기 {self.cache_read_input_tokens} · "
+            f"캐시 쓰기 {self.cache_creation_input_tokens} · 출력 {self.output_tokens} "
+            f"(캐시 적중 {self.cache_hit_rate:.0%})"
+        )
 
 
 # ============================================================
 # 3단계: Agent 루프 (핵심!)
 # ============================================================
-def run_agent(user_message: str, verbose: bool = True) -> str:
+# 모델이 도구 호출을 멈추지 않으면 루프가 끝없이 토큰과 시간을 씁니다.
+# 턴 수·토큰·전체 시간·도구별 시간에 예산을 두고, 예산이 다 되면
+# 도구 없이 지금까지의 정보로 최종 답변을 쓰게 합니다.
+FINAL_ANSWER_PROMPT = (
+    "작업 예산 또는 API 오류({reason})로 더 진행할 수 없습니다. 도구를 더 사용하지 말고 "
+    "지금까지 얻은 정보만으로 최종 답변을 작성하세요. 확인하지 못한 부분은 그렇다고 밝혀주세요."
+)
+FINAL_ANSWER_TIMEOUT = 30.0  # 최종 답변 요청에는 예산과 별도로 최대 이만큼 더 허용(초, 재시도 포함)
+
+# 시간 예산이 있을 때의 재시도 (SDK 자동 재시도는 시도마다 timeout을 새로 적용하므로 끄고 직접 수행)
+MAX_RETRIES = 2
+RETRY_BACKOFF = 0.5  # 첫 재시도 전 대기(초), 이후 2배씩
+RETRY_STATUS = {408, 409, 429}  # 그 밖에 5xx(529 과부하 포함)와 연결 오류도 재시도
+
+
+@dataclass
+class Budget:
+    """run_agent 한 번에 허용하는 자원"""
+
+    max_turns: int = 10  # 도구를 쓸 수 있는 모델 호출 수 (예산 소진 시 최종 답변 호출 1회 추가)
+    max_tokens: int = 100_000  # response.usage 기준 누적 토큰 (캐시 포함)
+    deadline: float | None = 120.0  # 전체 실행 시간(초)
+    tool_timeout: float = 10.0  # 도구 하나의 실행 시간(초)
+
+    def exhausted(self, stats: "RunStats", elapsed: float) -> str | None:
+        """소진된 예산 이름 (없으면 None)"""
+        if stats.turns >= self.max_turns:
+            return "max_turns"
+        if stats.usage.total >= self.max_tokens:
+            return "max_tokens"
+        if self.deadline is not None and elapsed >= self.deadline:
+            return "deadline"
+        return None
+
+    def remaining(self, elapsed: float) -> float | None:
+        return None if self.deadline is None else max(0.0, self.deadline - elapsed)
+
+
+@dataclass
+class RunStats:
+    """run_agent 실행 기록"""
+
+    turns: int = 0  # 모델 호출 수 (최종 답변 강제 호출 포함)
+    usage: Usage = field(default_factory=Usage)
+    elapsed: float = 0.0
+    stop_reason: str = ""  # "answer", 소진된 예산 이름("max_turns", "max_tokens", "deadline") 또는 "api_error"
+    forced_final: bool = False  # 예산 소진으로 최종 답변을 강제했는지
+    tool_latency: dict[str, list[float]] = field(default_factory=dict)  # 도구 이름 → 호출별 실행 시간(초)
+
+    def tool_breakdown(self) -> dict[str, dict]:
+        return {
+            name: {"calls": len(times), "total": sum(times), "max": max(times)}
+            for name, times in self.tool_latency.items()
+        }
+
+    def __str__(self) -> str:
+        lines = [
+            f"턴 {self.turns} · {self.elapsed:.2f}초 · 종료 사유 {self.stop_reason}"
+            + (" (최종 답변 강제)" if self.forced_final else ""),
+            f"토큰: {self.usage}",
+        ]
+        for name, t in self.tool_breakdown().items():
+            lines.append(f"도구 {name}: {t['calls']}회, 합계 {t['total']:.2f}초, 최대 {t['max']:.2f}초")
+        return "\n".join(lines)
+
+
+@dataclass
+class RunResult:
+    answer: str
+    stats: RunStats
+
+    def __str__(self) -> str:
+        return self.answer
+
+
+def _text_of(response) -> str:
+    return "\n".join(b.text for b in response.content if b.type == "text")
+
+
+def _retryable(error: APIError) -> bool:
+    if isinstance(error, APIConnectionError):  # 연결 실패·타임아웃
+        return True
+    return isinstance(error, APIStatusError) and (error.status_code in RETRY_STATUS or error.status_code >= 500)
+
+
+def create_message(request: dict, deadline_at: float | None = None):
+    """
+    messages.create 호출. deadline_at(time.monotonic 기준)이 있으면 재시도까지 합쳐 그 시각을 넘기지 않습니다.
+    (시도마다 timeout은 남은 시간, 재시도는 대기 후에도 시간이 남을 때만)
+    """
+    if deadline_at is None:
+        return client.messages.create(**request)
+    api = client.with_options(max_retries=0)
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return api.messages.create(**request, timeout=deadline_at - time.monotonic())
+        except APIError as e:
+            delay = RETRY_BACKOFF * 2**attempt
+            if not _retryable(e) or attempt == MAX_RETRIES or time.monotonic() + delay >= deadline_at:
+                raise
+            time.sleep(delay)
+
+
+def force_final_answer(messages: list, stats: RunStats, reason: str) -> str:
+    """예산이 소진됐을 때 도구 없이 최종 답변을 한 번 요청합니다. (최대 FINAL_ANSWER_TIMEOUT초)"""
+    last = messages[-1]  # 항상 user 메시지 (질문 또는 tool_result)
+    content = last["content"]
+    blocks = [{"type": "text", "text": content}] if isinstance(content, str) else list(content)
+    blocks.append({"type": "text", "text": FINAL_ANSWER_PROMPT.format(reason=reason)})
+    messages[-1] = {**last, "content": blocks}
+
+    request = build_request(messages)
+    request["tool_choice"] = {"type": "none"}  # 이전 tool_use가 있어 tools는 그대로 보내되 호출은 금지
+    stats.turns += 1
+    stats.forced_final = True
+    try:
+        response = create_message(request, time.monotonic() + FINAL_ANSWER_TIMEOUT)
+    except APIError as e:
+        return f"예산 소진({reason})으로 최종 답변을 만들지 못했습니다: {e}"
+    stats.usage.add(response.usage)
+    messages.append({"role": "assistant", "content": response.content})
+    return _text_of(response)
+
+
+def run_agent(user_message: str, verbose: bool = True, budget: Budget | None = None) -> RunResult:
     """
     ReAct Agent 루프를 실행합니다.
 
     Plan → Act → Observe 를 반복하며,
-    LLM이 도구 호출을 멈출 때까지 계속합니다.
+    LLM이 도구 호출을 멈추거나 예산(budget)이 소진될 때까지 계속합니다.
+    반환값의 answer는 최종 답변, stats는 턴·토큰·도구별 실행 시간 기록입니다.
     """
+    budget = budget or Budget()
+    stats = RunStats()
+    started = time.monotonic()
+
     if verbose:
         print(f"\n{'='*60}")
         print(f"🧑 사용자: {user_message}")
         print(f"{'='*60}")
 
     messages = [{"role": "user", "content": user_message}]
-    turn = 0
+    deadline_at = None if budget.deadline is None else started + budget.deadline
 
     while True:
-        turn += 1
+        reason = budget.exhausted(stats, time.monotonic() - started)
+        if reason:
+            break
+
+        stats.turns += 1
         if verbose:
-            print(f"\n--- Turn {turn} ---")
-
-        # LLM 호출
-        response = client.messages.create(
-            model="claude-sonnet-4-5-20250929",
-            max_tokens=1024,
-            tools=tools,
-            messages=messages,
-        )
+            print(f"\n--- Turn {stats.turns} ---")
+
+        # LLM 호출 (도구·시스템 프롬프트·이전 대화는 캐시에서 읽힘)
+        # 재시도까지 포함해 남은 시간 안에서만 기다리고, 일시적 오류가 계속되면 최종 답변으로 넘어감
+        try:
+            response = create_message(build_request(messages), deadline_at)
+        except APIError as e:
+            if not _retryable(e):
+                raise
+            if verbose:
+                print(f"  ⚠️  API 오류: {e}")
+            reason = "deadline" if deadline_at is not None and time.monotonic() >= deadline_at else "api_error"
+            break
+        turn_usage = stats.usage.add(response.usage)
 
         if verbose:
             print(f"  📡 stop_reason: {response.stop_reason}")
+            print(f"  💾 토큰: {turn_usage}")
 
         # 응답을 메시지에 추가
         messages.append({"role": "assistant", "content": response.content})
@@ -150,33 +654,39 @@ def run_agent(user_message: str, verbose: bool = True) -> str:
         # 도구 호출이 없으면 종료
         tool_uses = [b for b in response.content if b.type == "tool_use"]
         if not tool_uses:
-            final_text = "\n".join(
-                b.text for b in response.content if b.type == "text"
-            )
-            if verbose:
-                print(f"\n{'='*60}")
-                print(f"✅ 최종 답변:")
-                print(f"{final_text}")
-                print(f"{'='*60}")
-                print(f"총 {turn}번의 턴으로 완료")
-            return final_text
-
-        # 도구 실행 & 결과 전달
-        tool_results = []
-        for tool_use in tool_uses:
-            result = execute_tool(tool_use.name, tool_use.input)
-            if verbose:
-                print(f"  📋 결과: {result}")
-            tool_results.append(
-                {
-                    "type": "tool_result",
-                    "tool_use_id": tool_use.id,
-                    "content": result,
-                }
-            )
+            stats.stop_reason = "answer"
+            final_text = _text_of(response)
+            break
+
+        # 도구 실행 & 결과 전달 (여러 도구는 동시에 실행, 결과는 tool_use 순서대로)
+        # 도구 시간 제한은 tool_timeout과 남은 전체 시간 중 작은 쪽
+        remaining = budget.remaining(time.monotonic() - started)
+        timeout = budget.tool_timeout if remaining is None else min(budget.tool_timeout, remaining)
+        tool_started = time.perf_counter()
+        tool_results = registry.run(tool_uses, timeout=timeout, latencies=stats.tool_latency)
+        if verbose:
+            print(f"  ⏱️  도구 {len(tool_uses)}개 실행: {time.perf_counter() - tool_started:.2f}초")
+            for result in tool_results:
+                print(f"  📋 결과: {result['content']}")
 
         messages.append({"role": "user", "content": tool_results})
 
+    # 예산 소진·API 오류: 지금까지 모은 도구 결과로 최종 답변 (대화의 마지막은 항상 user 메시지)
+    if reason:
+        if verbose:
+            print(f"\n⛔ 중단: {reason} - 도구 없이 최종 답변을 요청합니다")
+        stats.stop_reason = reason
+        final_text = force_final_answer(messages, stats, reason)
+
+    stats.elapsed = time.monotonic() - started
+    if verbose:
+        print(f"\n{'='*60}")
+        print(f"✅ 최종 답변:")
+        print(f"{final_text}")
+        print(f"{'='*60}")
+        print(stats)
+    return RunResult(final_text, stats)
+
 
 # ============================================================
 # 실행
@@ -9,6 +9,7 @@ Generator → Evaluator → 개선 루프를 구현합니다.
 """
 
 import json
+from dataclasses import dataclass, field
 
 from anthropic import Anthropic
 from dotenv import load_dotenv
@@ -17,37 +18,87 @@ load_dotenv()
 
 client = Anthropic()
 
+MODEL = "claude-sonnet-4-5-20250929"
+
+
+# ============================================================
+# 프롬프트 캐시: 반복마다 같은 앞부분은 캐시에서 읽기
+# ============================================================
+# 반복 루프에서는 작업 설명과 평가 기준이 매번 똑같이 전송됩니다.
+# 변하지 않는 부분을 앞에 두고 끝에 cache_control을 달면, 두 번째 호출부터는
+# 그 부분을 캐시에서 읽습니다. (모델별 최소 길이보다 짧으면 캐시되지 않습니다.)
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def cached_text(text: str) -> dict:
+    """캐시 지점이 표시된 텍스트 블록"""
+    return {"type": "text", "text": text, "cache_control": CACHE_CONTROL}
+
+
+@dataclass
+class Usage:
+    """response.usage 누적 (input_tokens에는 캐시에서 읽거나 캐시에 쓴 토큰이 포함되지 않음)"""
+
+    TOKEN_FIELDS = ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens")
+
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_input_tokens: int = 0
+    cache_creation_input_tokens: int = 0
+    last: "Usage | None" = field(default=None, repr=False, compare=False)  # 마지막으로 더한 응답 하나의 Usage
+
+    def add(self, usage) -> "Usage":
+        """한 번의 응답 usage를 더하고, 그 응답만의 Usage를 반환 (self.last에도 보관)"""
+        call = Usage(**{name: getattr(usage, name, 0) or 0 for name in self.TOKEN_FIELDS})
+        for name in self.TOKEN_FIELDS:
+            setattr(self, name, getattr(self, name) + getattr(call, name))
+        self.last = call
+        return call
+
+    @property
+    def total(self) -> int:
+        """처리된 전체 토큰 (캐시 포함)"""
+        return sum(getattr(self, name) for name in self.TOKEN_FIELDS)
+
+    @property
+    def cache_hit_rate(self) -> float:
+        total = self.input_tokens + self.cache_read_input_tokens + self.cache_creation_input_tokens
+        return self.cache_read_input_tokens / total if total else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"입력 {self.input_tokens} · 캐시 읽기 {self.cache_read_input_tokens} · "
+            f"캐시 쓰기 {self.cache_creation_input_tokens} · 출력 {self.output_tokens} "
+            f"(캐시 적중 {self.cache_hit_rate:.0%})"
+        )
+
 
 # ============================================================
 # Generator: 결과물 생성
 # ============================================================
-def generate(task: str, feedback: str | None = None) -> str:
+def generate(task: str, feedback: str | None = None, usage: Usage | None = None) -> str:
     """작업을 수행하여 결과물을 생성합니다."""
-    prompt = f"다음 작업을 수행해주세요:\n\n{task}"
+    # 작업 설명은 반복마다 같으므로 캐시하고, 바뀌는 피드백은 그 뒤에 붙임
+    content = [cached_text(f"다음 작업을 수행해주세요:\n\n{task}")]
     if feedback:
-        prompt += f"\n\n⚠️ 이전 평가에서 받은 피드백을 반드시 반영해주세요:\n{feedback}"
+        content.append({"type": "text", "text": f"⚠️ 이전 평가에서 받은 피드백을 반드시 반영해주세요:\n{feedback}"})
 
     response = client.messages.create(
-        model="claude-sonnet-4-5-20250929",
+        model=MODEL,
         max_tokens=2048,
-        messages=[{"role": "user", "content": prompt}],
+        messages=[{"role": "user", "content": content}],
     )
+    if usage is not None:
+        usage.add(response.usage)
     return response.content[0].text
 
 
 # ============================================================
 # Evaluator: 결과물 평가
 # ============================================================
-def evaluate(task: str, result: str) -> dict:
-    """결과물을 평가하고 점수와 피드백을 반환합니다."""
-    prompt = f"""당신은 엄격하지만 공정한 평가자입니다.
-다음 작업의 결과물을 평가해주세요.
-
-## 작업
-{task}
-
-## 결과물
-{result}
+# 평가 기준과 응답 형식은 모든 평가에서 같으므로 시스템 프롬프트로 두고 캐시
+EVALUATOR_PROMPT = """당신은 엄격하지만 공정한 평가자입니다.
+사용자가 보내는 작업의 결과물을 평가해주세요.
 
 ## 평가 기준
 1. 정확성 (내용이 정확한가?)
@@ -58,13 +109,27 @@ def evaluate(task: str, result: str) -> dict:
 ## 응답 형식
 반드시 아래 JSON 형식으로만 응답하세요. 다른 텍스트를 추가하지 마세요.
 
-{{"score": <1-10 정수>, "strengths": "<잘한 점>", "weaknesses": "<개선할 점>", "feedback": "<구체적 개선 방향>"}}"""
+{"score": <1-10 정수>, "strengths": "<잘한 점>", "weaknesses": "<개선할 점>", "feedback": "<구체적 개선 방향>"}"""
+
 
+def evaluate(task: str, result: str, usage: Usage | None = None) -> dict:
+    """결과물을 평가하고 점수와 피드백을 반환합니다."""
     response = client.messages.create(
-        model="claude-sonnet-4-5-20250929",
+        model=MODEL,
         max_tokens=1024,
-        messages=[{"role": "user", "content": prompt}],
+        system=[cached_text(EVALUATOR_PROMPT)],
+        messages=[
+            {
+                "role": "user",
+                "content": [
+                    cached_text(f"## 작업\n{task}"),  # 반복마다 같은 부분까지 캐시
+                    {"type": "text", "text": f"## 결과물\n{result}"},
+                ],
+            }
+        ],
     )
+    if usage is not None:
+        usage.add(response.usage)
 
     text = response.content[0].text.strip()
 
@@ -110,10 +175,12 @@ def reflection_agent(
         print(f"\n--- Iteration 0: 초기 생성 ---")
         print("  ⏳ 생성 중...")
 
-    result = generate(task)
+    usage = Usage()
+    result = generate(task, usage=usage)
 
     if verbose:
         print(f"  ✅ 생성 완료 ({len(result)}자)")
+        print(f"  💾 토큰: {usage.last}")
         print(f"  📝 미리보기: {result[:150]}...")
 
     history = []
@@ -125,7 +192,7 @@ def reflection_agent(
             print("  ⏳ 평가 중...")
 
         # 평가
-        evaluation = evaluate(task, result)
+        evaluation = evaluate(task, result, usage=usage)
         score = evaluation.get("score", 0)
 
         history.append(
@@ -139,6 +206,7 @@ def reflection_agent(
 
         if verbose:
             print(f"  📊 점수: {score}/10")
+            print(f"  💾 토큰: {usage.last}")
             print(f"  ✅ 잘한 점: {evaluation.get('strengths', '')}")
             print(f"  ⚠️ 개선점: {evaluation.get('weaknesses', '')}")
 
@@ -154,10 +222,11 @@ def reflection_agent(
             print(f"  💡 피드백: {feedback}")
             print(f"  ⏳ 피드백 반영하여 재생성 중...")
 
-        result = generate(task, feedback)
+        result = generate(task, feedback, usage=usage)
 
         if verbose:
             print(f"  ✅ 재생성 완료 ({len(result)}자)")
+            print(f"  💾 토큰: {usage.last}")
     else:
         if verbose:
             print(f"\n⏰ 최대 반복 횟수 {max_iterations}회 도달")
@@ -169,12 +238,14 @@ def reflection_agent(
         for h in history:
             bar = "█" * h["score"] + "░" * (10 - h["score"])
             print(f"  반복 {h['iteration']}: [{bar}] {h['score']}/10")
+        print(f"💾 누적 토큰: {usage}")
         print(f"{'='*60}")
 
     return {
         "result": result,
         "history": history,
         "iterations": len(history),
+        "usage": usage,
     }
 
 
@@ -10,12 +10,25 @@ AI가 생성한 위험한 코드가 어떻게 탐지·차단되는지 직접 체
 - AST(Abstract Syntax Tree) 기반 정적 분석
 - 허용목록(Allowlist) vs 차단목록(Denylist) 전략
 - Python 클래스 계층 탐색을 통한 탈출 시도 원리
+- 분석/컴파일 결과 캐시로 반복 제출 비용 제거
+- 단일 패스 스캐너로 모든 위반을 위치와 함께 보고
+- 프로세스 풀 기반 대량 사전 검사 (analyze_many)
+
+벤치마크: python 01_sandbox_escape_demo.py --bench        (분석 엔진)
+         python 01_sandbox_escape_demo.py --bench-batch  (대량 검사 처리량)
 """
 
 import ast
+import hashlib
+import marshal
+import multiprocessing
+import os
 import signal
 import sys
 import textwrap
+import threading
+import time
+from collections import OrderedDict, namedtuple
 from typing import Optional
 
 
@@ -28,6 +41,19 @@ class SecurityError(Exception):
     pass
 
 
+# 위반 유형별 메시지 (DangerousCodeDetector / PolicyScanner 공용)
+VIOLATION_MESSAGES = {
+    'import': "🚫 금지된 모듈 import: '{name}'\n"
+              "   허용되지 않은 모듈에 접근하려 했습니다.",
+    'import_from': "🚫 금지된 모듈 import: 'from {name} import ...'\n"
+                   "   허용되지 않은 모듈에 접근하려 했습니다.",
+    'call': "🚫 금지된 함수 호출: '{name}()'\n"
+            "   위험한 내장 함수 사용이 차단되었습니다.",
+    'attribute': "🚫 클래스 계층 탐색 감지: '.{name}'\n"
+                 "   Python 내부 구조를 통한 탈출 시도가 차단되었습니다.",
+}
+
+
 class DangerousCodeDetector(ast.NodeVisitor):
     """
     AST 노드를 순회하며 위험한 패턴을 탐지하는 정적 분석기.
@@ -63,10 +89,7 @@ class DangerousCodeDetector(ast.NodeVisitor):
         for alias in node.names:
             module_root = alias.name.split('.')[0]
             if module_root in self.FORBIDDEN_MODULES:
-                raise SecurityError(
-                    f"🚫 금지된 모듈 import: '{alias.name}'\n"
-                    f"   허용되지 않은 모듈에 접근하려 했습니다."
-                )
+                raise SecurityError(VIOLATION_MESSAGES['import'].format(name=alias.name))
         self.generic_visit(node)
 
     def visit_ImportFrom(self, node: ast.ImportFrom):
@@ -74,51 +97,287 @@ class DangerousCodeDetector(ast.NodeVisitor):
         module = node.module or ''
         module_root = module.split('.')[0]
         if module_root in self.FORBIDDEN_MODULES:
-            raise SecurityError(
-                f"🚫 금지된 모듈 import: 'from {module} import ...'\n"
-                f"   허용되지 않은 모듈에 접근하려 했습니다."
-            )
+            raise SecurityError(VIOLATION_MESSAGES['import_from'].format(name=module))
         self.generic_visit(node)
 
     def visit_Call(self, node: ast.Call):
         """__import__('os'), eval(...) → 차단"""
         if isinstance(node.func, ast.Name):
             if node.func.id in self.FORBIDDEN_CALLS:
-                raise SecurityError(
-                    f"🚫 금지된 함수 호출: '{node.func.id}()'\n"
-                    f"   위험한 내장 함수 사용이 차단되었습니다."
-                )
+                raise SecurityError(VIOLATION_MESSAGES['call'].format(name=node.func.id))
         self.generic_visit(node)
 
     def visit_Attribute(self, node: ast.Attribute):
         """obj.__class__.__bases__[0].__subclasses__() → 차단"""
         if node.attr in self.FORBIDDEN_ATTRIBUTES:
-            raise SecurityError(
-                f"🚫 클래스 계층 탐색 감지: '.{node.attr}'\n"
-                f"   Python 내부 구조를 통한 탈출 시도가 차단되었습니다."
-            )
+            raise SecurityError(VIOLATION_MESSAGES['attribute'].format(name=node.attr))
         self.generic_visit(node)
 
 
+# ── 단일 패스 정책 스캐너 ─────────────────────────────────
+# DangerousCodeDetector는 첫 위반에서 예외로 멈추고, 노드마다
+# getattr('visit_' + 클래스명) 디스패치 + generic_visit 재귀를 거칩니다.
+# PolicyScanner는 명시적 스택으로 트리를 한 번만 돌며 노드 타입 → 검사 함수
+# 테이블로 디스패치하고, 모든 위반을 (행, 열)과 함께 수집합니다. (O(노드 수))
+
+Violation = namedtuple('Violation', 'line col kind name message')
+
+
+class PolicyScanner:
+    """테이블 기반·반복 순회 정적 분석기. scan()은 모든 위반을 소스 순서로 반환"""
+
+    def __init__(
+        self,
+        forbidden_modules=DangerousCodeDetector.FORBIDDEN_MODULES,
+        forbidden_calls=DangerousCodeDetector.FORBIDDEN_CALLS,
+        forbidden_attributes=DangerousCodeDetector.FORBIDDEN_ATTRIBUTES,
+    ):
+        self.forbidden_modules = frozenset(forbidden_modules)
+        self.forbidden_calls = frozenset(forbidden_calls)
+        self.forbidden_attributes = frozenset(forbidden_attributes)
+        # 노드 타입 → 검사 함수 (검사가 필요 없는 타입은 순회만 함)
+        self._checks = {
+            ast.Import: self._check_import,
+            ast.ImportFrom: self._check_import_from,
+            ast.Call: self._check_call,
+            ast.Attribute: self._check_attribute,
+        }
+
+    def scan(self, tree: ast.AST) -> list:
+        violations = []
+        checks = self._checks
+        node_ast = ast.AST
+        stack = [tree]
+        pop, push = stack.pop, stack.append
+
+        while stack:
+            node = pop()
+            node_type = type(node)
+            check = checks.get(node_type)
+            if check is not None:
+                check(node, violations)
+            for field in node_type._fields:
+                value = getattr(node, field, None)
+                if type(value) is list:
+                    for item in value:
+                        if isinstance(item, node_ast):
+                            push(item)
+                elif isinstance(value, node_ast):
+                    push(value)
+
+        violations.sort()
+        return violations
+
+    def _add(self, violations, node, kind, name, line=None, col=None):
+        violations.append(Violation(
+            node.lineno if line is None else line, node.col_offset if col is None else col, kind, name,
+            VIOLATION_MESSAGES[kind].format(name=name),
+        ))
+
+    def _check_import(self, node, violations):
+        for alias in node.names:
+            if alias.name.split('.')[0] in self.forbidden_modules:
+                self._add(violations, node, 'import', alias.name)
+
+    def _check_import_from(self, node, violations):
+        module = node.module or ''
+        if module.split('.')[0] in self.forbidden_modules:
+            self._add(violations, node, 'import_from', module)
+
+    def _check_call(self, node, violations):
+        func = node.func
+        if type(func) is ast.Name and func.id in self.forbidden_calls:
+            self._add(violations, node, 'call', func.id)
+
+    def _check_attribute(self, node, violations):
+        if node.attr in self.forbidden_attributes:
+            # Attribute의 col_offset은 식 전체의 시작이므로 속성 이름 위치로 보정
+            # (속성 이름은 식의 끝에 있으므로 줄 번호도 end_lineno — 여러 줄에 걸친 접근 대응)
+            self._add(violations, node, 'attribute', node.attr,
+                      line=node.end_lineno, col=node.end_col_offset - len(node.attr))
+
+
+policy_scanner = PolicyScanner()
+
+
+def format_violations(violations: list) -> str:
+    """첫 위반의 메시지 + 나머지 위반 위치 요약"""
+    text = violations[0].message
+    rest = violations[1:]
+    if rest:
+        shown = ", ".join(f"{v.line}행 '{v.name}'" for v in rest[:5])
+        more = f" 외 {len(rest) - 5}건" if len(rest) > 5 else ""
+        text += f"\n   (추가 위반 {len(rest)}건: {shown}{more})"
+    return text
+
+
+# ── 분석 결과 + 컴파일 결과 캐시 ─────────────────────────
+# 에이전트는 같은(또는 거의 같은) 코드를 반복 제출합니다.
+# 소스 해시를 키로 판정 결과와 code object를 저장해 두면
+# 재제출 시 ast.parse / 탐지기 순회 / compile을 모두 건너뜁니다.
+
+class CompiledSnippet:
+    """캐시 항목: 정적 분석 판정 + exec/eval code object"""
+
+    __slots__ = ('verdict', 'violations', 'exec_code', 'eval_code', 'size')
+
+    def __init__(self, verdict: Optional[str], violations=(), exec_code=None, eval_code=None):
+        self.verdict = verdict          # None이면 안전, 문자열이면 차단 사유
+        self.violations = tuple(violations)  # PolicyScanner가 찾은 전체 위반 목록
+        self.exec_code = exec_code      # 안전한 코드만 컴파일해 둠
+        self.eval_code = eval_code      # 단일 표현식일 때만 존재
+        self.size = len(verdict or '') + sum(len(v.message) for v in self.violations) + sum(
+            len(marshal.dumps(c)) for c in (exec_code, eval_code) if c is not None
+        )
+
+
+class CodeCache:
+    """
+    소스 해시(blake2b) → CompiledSnippet LRU 캐시.
+    항목 수와 추정 메모리(마샬링 크기) 두 가지 상한을 모두 지킵니다.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(code: str) -> bytes:
+        return hashlib.blake2b(code.encode('utf-8', errors='surrogatepass'), digest_size=16).digest()
+
+    def get(self, code: str) -> Optional[CompiledSnippet]:
+        key = self.key(code)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, code: str, entry: CompiledSnippet):
+        if entry.size > self.max_bytes:
+            return
+        key = self.key(code)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+code_cache = CodeCache()
+
+
+def _scan_source(code: str):
+    """파싱 + 정책 스캔. (트리 또는 None, 판정 또는 None, 위반 목록) 반환"""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return None, f"🚫 문법 오류: {e}", []
+    violations = policy_scanner.scan(tree)
+    return tree, (format_violations(violations) if violations else None), violations
+
+
+def _build_snippet(code: str) -> CompiledSnippet:
+    """파싱 + 정책 스캔 + 컴파일. 파싱은 되지만 컴파일에서 걸리는 코드('return 1' 등)도 문법 오류로 판정"""
+    tree, verdict, violations = _scan_source(code)
+    if verdict:
+        return CompiledSnippet(verdict, violations)
+    try:
+        exec_code = compile(tree, '<sandbox>', 'exec')
+        eval_code = None
+        if len(tree.body) == 1 and isinstance(tree.body[0], ast.Expr):
+            eval_code = compile(ast.Expression(body=tree.body[0].value), '<sandbox>', 'eval')
+    except SyntaxError as e:
+        return CompiledSnippet(f"🚫 문법 오류: {e}", [])
+    return CompiledSnippet(None, exec_code=exec_code, eval_code=eval_code)
+
+
+def compile_checked(code: str) -> CompiledSnippet:
+    """
+    정적 분석 + 컴파일을 한 번에 수행하고 결과를 캐시합니다.
+
+    ast.parse로 만든 트리를 분석과 컴파일에 그대로 재사용하므로
+    소스는 캐시 미스일 때 딱 한 번만 파싱됩니다.
+    """
+    entry = code_cache.get(code)
+    if entry is not None:
+        return entry
+
+    entry = _build_snippet(code)
+    code_cache.put(code, entry)
+    return entry
+
+
 def analyze_code(code: str) -> Optional[str]:
     """
-    코드를 정적으로 분석합니다.
+    코드를 정적으로 분석합니다. (결과는 code_cache에 캐시)
 
     Returns:
         None: 안전한 코드
         str: 발견된 위험 설명
     """
-    try:
-        tree = ast.parse(code)
-    except SyntaxError as e:
-        return f"🚫 문법 오류: {e}"
+    return compile_checked(code).verdict
 
-    detector = DangerousCodeDetector()
-    try:
-        detector.visit(tree)
-        return None  # 안전
-    except SecurityError as e:
-        return str(e)
+
+# ── 대량 사전 검사 (프로세스 풀) ───────────────────────────
+# 저장소 단위로 LLM 생성 코드를 실행 전에 걸러낼 때 사용합니다.
+# 파싱은 CPU 바운드라 GIL을 피하려면 프로세스로 나눠야 하고,
+# 스니펫이 작으므로 chunksize 단위로 묶어 보내 IPC 왕복을 줄입니다.
+
+def _screen_source(code: str) -> Optional[str]:
+    """풀 워커용: 캐시 없이 판정만 계산 (컴파일 단계 문법 오류까지 analyze_code와 동일)"""
+    return _build_snippet(code).verdict
+
+
+def analyze_many(sources, workers: Optional[int] = None, chunksize: int = 256):
+    """
+    여러 코드를 병렬로 정적 분석하고 판정을 입력 순서대로 하나씩 내보냅니다.
+
+    Args:
+        sources: 코드 문자열 iterable (리스트가 아니어도 됨)
+        workers: 프로세스 수 (기본: CPU 코어 수, 1이면 현재 프로세스에서 실행)
+        chunksize: 워커에 한 번에 보내는 스니펫 수
+
+    Yields:
+        analyze_code()와 같은 판정 (None: 안전, str: 위험 설명)
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for code in sources:
+            yield _screen_source(code)
+        return
+
+    # 제너레이터를 중간에 닫으면 with 블록이 풀을 terminate
+    with multiprocessing.Pool(workers) as pool:
+        yield from pool.imap(_screen_source, sources, chunksize)
 
 
 # ============================================================
@@ -147,11 +406,11 @@ def safe_eval(code: str, timeout_sec: int = 3) -> dict:
         'error': None,
     }
 
-    # 1단계: 정적 분석
-    danger = analyze_code(code)
-    if danger:
+    # 1단계: 정적 분석 (+ 컴파일, 반복 제출 시 캐시 적중)
+    snippet = compile_checked(code)
+    if snippet.verdict:
         result['blocked'] = True
-        result['reason'] = danger
+        result['reason'] = snippet.verdict
         return result
 
     # 2단계: 제한된 실행 환경 구성
@@ -195,10 +454,10 @@ def safe_eval(code: str, timeout_sec: int = 3) -> dict:
     output_buf = io.StringIO()
     try:
         with redirect_stdout(output_buf):
-            exec(compile(code, '<sandbox>', 'exec'), namespace)
+            exec(snippet.exec_code, namespace)
         result['output'] = output_buf.getvalue() or repr(
-            eval(compile(code, '<sandbox>', 'eval'), namespace)
-            if '\n' not in code.strip() else None
+            eval(snippet.eval_code, namespace)
+            if snippet.eval_code is not None else None
         )
     except TimeoutError:
         result['blocked'] = True
@@ -255,6 +514,103 @@ ESCAPE_EXAMPLES = {
 }
 
 
+# ============================================================
+# 섹션 4: 분석 엔진 벤치마크 (NodeVisitor vs PolicyScanner)
+# ============================================================
+
+SYNTHETIC_BLOCK = """\
+def f{i}(data, k={i}):
+    total = 0
+    for x in data:
+        if x % 3 == k % 3:
+            total += abs(x) * k
+    return [str(v).upper() for v in sorted(data) if v > total]
+
+result{i} = f{i}(list(range({i} % 50)))
+"""
+
+
+def synthetic_source(lines: int, violation_every: int = 0) -> str:
+    """약 lines줄짜리 생성 코드. violation_every > 0이면 그 블록 간격마다 탈출 시도를 섞음"""
+    block_lines = SYNTHETIC_BLOCK.count('\n')
+    parts = []
+    for i in range(max(1, lines // block_lines)):
+        parts.append(SYNTHETIC_BLOCK.format(i=i))
+        if violation_every and i % violation_every == 0:
+            parts.append(f"leak{i} = ().__class__.__bases__\n")
+    return ''.join(parts)
+
+
+def _best_of(fn, rounds: int) -> float:
+    best = float('inf')
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def synthetic_corpus(count: int) -> list:
+    """서로 다른 짧은 스니펫 count개 (약 5%는 탈출 시도)"""
+    unsafe = [e['code'] for e in ESCAPE_EXAMPLES.values() if e['name'].startswith('🗡️')]
+    corpus = []
+    for i in range(count):
+        if i % 20 == 0:
+            corpus.append(f"{unsafe[i % len(unsafe)]}  # {i}")
+        else:
+            corpus.append(SYNTHETIC_BLOCK.format(i=i))
+    return corpus
+
+
+def run_batch_benchmark(count: int = 100_000, chunksize: int = 256):
+    """analyze_many 처리량을 워커 수별로 측정 (1, 2, 4, ... CPU 코어 수)"""
+    corpus = synthetic_corpus(count)
+    cpu = os.cpu_count() or 1
+    worker_counts = sorted({1, cpu} | {w for w in (2, 4, 8, 16, 32) if w < cpu})
+
+    print(f"\n📦 analyze_many — 스니펫 {count:,}개, chunksize={chunksize}, CPU {cpu}개")
+    print(f"{'workers':>8} {'초':>8} {'스니펫/초':>12} {'배속':>6} {'효율':>6} {'차단':>8}")
+    print("─" * 54)
+    baseline = None
+    for workers in worker_counts:
+        t0 = time.perf_counter()
+        blocked = sum(1 for verdict in analyze_many(corpus, workers, chunksize) if verdict)
+        elapsed = time.perf_counter() - t0
+        baseline = baseline or elapsed
+        speedup = baseline / elapsed
+        print(f"{workers:>8} {elapsed:>8.2f} {count / elapsed:>12,.0f} "
+              f"{speedup:>5.1f}x {speedup / workers:>6.0%} {blocked:>8,}")
+    if cpu == 1:
+        print("   (CPU가 1개라 확장성은 측정할 수 없습니다)")
+
+
+def run_benchmark(line_counts=(2000, 5000, 20000, 50000), rounds: int = 5):
+    """같은 AST에 대해 기존 visitor와 단일 패스 스캐너의 순회 시간을 비교 (파싱 시간 제외)"""
+
+    def run_visitor(tree):
+        try:
+            DangerousCodeDetector().visit(tree)
+        except SecurityError:
+            pass
+
+    for label, violation_every in (("위반 없음 (전체 순회)", 0), ("위반 포함 (50블록마다)", 50)):
+        print(f"\n📊 {label} — best of {rounds}")
+        if violation_every:
+            print("   (visitor는 첫 위반에서 예외로 멈추므로 1건만 보고합니다)")
+        print(f"{'줄 수':>8} {'노드 수':>10} {'visitor ms':>12} {'scanner ms':>12} "
+              f"{'배속':>6} {'µs/줄':>8} {'위반(v/s)':>10}")
+        print("─" * 74)
+        for lines in line_counts:
+            tree = ast.parse(synthetic_source(lines, violation_every))
+            nodes = sum(1 for _ in ast.walk(tree))
+            visitor_s = _best_of(lambda: run_visitor(tree), rounds)
+            scanner_s = _best_of(lambda: policy_scanner.scan(tree), rounds)
+            found = len(policy_scanner.scan(tree))
+            print(f"{lines:>8,} {nodes:>10,} {visitor_s * 1000:>12.2f} {scanner_s * 1000:>12.2f} "
+                  f"{visitor_s / scanner_s:>5.1f}x {scanner_s * 1e6 / lines:>8.2f} "
+                  f"{min(found, 1)}/{found:>3}")
+
+
 # ============================================================
 # 메인: 대화형 데모 인터페이스
 # ============================================================
@@ -304,6 +660,8 @@ def run_all_examples():
         run_demo(example['code'], example['name'])
         input("\n   [Enter] 다음 예제로...")
 
+    print(f"\n🗃️  분석 캐시: {code_cache.stats()}")
+
 
 def interactive_mode():
     """사용자가 직접 코드 입력하는 대화형 모드"""
@@ -338,6 +696,10 @@ def interactive_mode():
 if __name__ == '__main__':
     if len(sys.argv) > 1 and sys.argv[1] == '--all':
         run_all_examples()
+    elif len(sys.argv) > 1 and sys.argv[1] == '--bench':
+        run_benchmark()
+    elif len(sys.argv) > 1 and sys.argv[1] == '--bench-batch':
+        run_batch_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 100_000)
     else:
         print_banner()
         print("실행 옵션을 선택하세요:")
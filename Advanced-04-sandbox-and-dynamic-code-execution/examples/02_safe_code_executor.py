@@ -12,17 +12,35 @@
 - resource 모듈로 CPU/메모리/파일 제한
 - 환경변수 격리로 민감 정보 차단
 - timeout으로 무한루프 방어
+- asyncio로 여러 코드를 동시에 실행 (execute_async / execute_many)
+- 출력 스트리밍 + 출력 바이트 상한 (execute_stream)
+- 실행별 자원 사용량(os.wait4) + 최근 실행 백분위수 통계 (executor.stats)
+- 워커 풀로 인터프리터 기동 비용 제거
+- zygote(fork-server)로 작업당 fork 한 번만 지불
+
+벤치마크: python 02_safe_code_executor.py --bench [반복 횟수]
 
 ⚠️  참고: resource 모듈은 macOS에서 일부 제한이 있습니다.
    (RLIMIT_AS가 RLIMIT_RSS로 대체될 수 있음)
 """
 
+import asyncio
+import codecs
+import collections
+import json
+import math
 import os
+import queue
 import resource
+import select
+import selectors
+import signal
+import struct
 import subprocess
 import sys
 import tempfile
 import textwrap
+import threading
 import time
 from typing import Optional
 
@@ -78,14 +96,12 @@ def print_resource_limits():
 # 섹션 2: subprocess 기반 격리 실행기
 # ============================================================
 
-SANDBOX_WRAPPER = """
+SANDBOX_LIMITS = """
 import resource
-import sys
-import os
 
 # ── Resource Limits 설정 ──────────────────────────────────
 # CPU 시간: {cpu_limit}초 초과 시 SIGXCPU → 프로세스 종료
-resource.setrlimit(resource.RLIMIT_CPU, ({cpu_limit}, {cpu_limit}))
+resource.setrlimit(resource.RLIMIT_CPU, ({cpu_limit}, {cpu_hard_limit}))
 
 # 파일 크기: {file_limit}바이트 초과 시 IOError
 resource.setrlimit(resource.RLIMIT_FSIZE, ({file_limit}, {file_limit}))
@@ -104,6 +120,10 @@ except Exception:
         resource.setrlimit(resource.RLIMIT_RSS, ({mem_limit}, {mem_limit}))
     except Exception:
         pass
+"""
+
+SANDBOX_ENV_SCRUB = """
+import os
 
 # ── 환경 격리 ───────────────────────────────────────────
 # 민감한 환경변수 제거 (API 키, 패스워드 등)
@@ -111,11 +131,177 @@ sensitive_env_prefixes = ('AWS_', 'ANTHROPIC_', 'OPENAI_', 'SECRET_', 'PASSWORD_
 for key in list(os.environ.keys()):
     if any(key.startswith(p) for p in sensitive_env_prefixes):
         del os.environ[key]
+"""
+
+SANDBOX_PRELUDE = "\nimport sys\n" + SANDBOX_LIMITS + SANDBOX_ENV_SCRUB
 
+SANDBOX_WRAPPER = SANDBOX_PRELUDE + """
 # ── 사용자 코드 실행 ────────────────────────────────────
 {user_code}
 """
 
+# 자식 프로세스에 전달하는 최소 환경변수
+SANDBOX_ENV = {
+    'PATH': '/usr/bin:/bin:/usr/local/bin',
+    'PYTHONPATH': '',
+    'HOME': '/tmp',
+    'LANG': 'en_US.UTF-8',
+}
+
+
+# 스트리밍 모드는 출력이 생기는 즉시 전달되도록 자식의 stdout 버퍼링을 끔
+STREAM_ENV = dict(SANDBOX_ENV, PYTHONUNBUFFERED='1')
+
+TRUNCATION_MARKER = "\n✂️  [출력 제한 {limit:,} bytes 초과 — 이후 출력은 잘렸습니다]\n"
+
+
+class _OutputLimiter:
+    """스트리밍 출력의 누적 바이트 상한을 지키면서 UTF-8을 점진적으로 디코딩"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total = 0
+        self.truncated = False
+        self._decoders = {
+            name: codecs.getincrementaldecoder('utf-8')(errors='replace')
+            for name in ('stdout', 'stderr')
+        }
+
+    def feed(self, stream: str, data: bytes) -> str:
+        """청크를 상한까지만 받아 디코딩. 상한에 닿으면 잘림 표시를 붙임"""
+        remaining = self.max_bytes - self.total
+        if len(data) > remaining:
+            data = data[:remaining]
+            self.truncated = True
+        self.total += len(data)
+        text = self._decoders[stream].decode(data, final=self.truncated)
+        if self.truncated:
+            text += TRUNCATION_MARKER.format(limit=self.max_bytes)
+        return text
+
+    def flush(self, stream: str) -> str:
+        """스트림 종료 시 디코더에 남은 바이트 처리"""
+        return self._decoders[stream].decode(b'', final=True)
+
+
+def _kill_process_group(pid: int):
+    """프로세스 그룹 전체에 SIGKILL (이미 종료된 경우 무시)"""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+# ru_maxrss 단위: Linux는 KB, macOS는 bytes
+_MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+def _rusage_to_dict(after, before=None, with_peak: bool = True) -> dict:
+    """
+    struct_rusage를 결과 dict용 자원 사용량으로 변환.
+    before가 주어지면 누적 항목은 (after - before) 차이로 계산합니다.
+    """
+    def delta(field):
+        value = getattr(after, field)
+        return value - getattr(before, field) if before is not None else value
+
+    return {
+        'user_cpu': round(delta('ru_utime'), 4),          # 사용자 모드 CPU (초)
+        'sys_cpu': round(delta('ru_stime'), 4),           # 커널 모드 CPU (초)
+        'peak_rss_bytes': after.ru_maxrss * _MAXRSS_UNIT if with_peak else None,
+        'minor_faults': delta('ru_minflt'),
+        'major_faults': delta('ru_majflt'),
+        'voluntary_ctx_switches': delta('ru_nvcsw'),      # I/O 대기 등 자발적 양보
+        'involuntary_ctx_switches': delta('ru_nivcsw'),   # 스케줄러에 의한 선점
+        'bytes_written': delta('ru_oublock') * 512,       # 블록 출력 기준 추정치
+    }
+
+
+def _reap(proc: subprocess.Popen, deadline: Optional[float] = None):
+    """
+    os.wait4로 자식을 수거하고 (종료 코드, 자원 사용량) 반환.
+    deadline(time.monotonic 기준)이 주어지면 그때까지만 기다리고, 넘기면 None (자식은 그대로 둠).
+    """
+    delay = 0.001
+    while True:
+        pid, status, rusage = os.wait4(proc.pid, 0 if deadline is None else os.WNOHANG)
+        if pid:
+            break
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.05)
+    proc.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    return proc.returncode, _rusage_to_dict(rusage)
+
+
+def _signal_name(returncode: int) -> str:
+    """음수 종료 코드(-N)를 시그널 이름으로 변환"""
+    try:
+        return signal.Signals(-returncode).name
+    except Exception:
+        return f"Signal {-returncode}"
+
+
+class ExecutionStats:
+    """
+    최근 실행 N건의 지연 시간·자원 사용량 집계 (용량 계획용).
+
+    summary()는 항목별 p50/p90/p99/max와 종료 원인별 건수를 돌려줍니다.
+    여러 스레드에서 동시에 record()해도 안전합니다.
+    """
+
+    METRICS = ('elapsed', 'user_cpu', 'sys_cpu', 'peak_rss_bytes', 'bytes_written')
+
+    def __init__(self, window: int = 1000):
+        self._records = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.total_runs = 0
+        self.outcomes = collections.Counter()
+
+    def record(self, result: dict):
+        resources = result.get('resources') or {}
+        row = {'elapsed': result['elapsed']}
+        for metric in self.METRICS[1:]:
+            row[metric] = resources.get(metric)
+        outcome = result['killed_by'] or ('ok' if result['success'] else 'error')
+        with self._lock:
+            self._records.append(row)
+            self.total_runs += 1
+            self.outcomes[outcome] += 1
+
+    def percentiles(self, metric: str, percents=(50, 90, 99)) -> dict:
+        """최근 실행에서 metric의 백분위수 (nearest-rank). 값이 없으면 빈 dict"""
+        with self._lock:
+            values = sorted(r[metric] for r in self._records if r[metric] is not None)
+        if not values:
+            return {}
+        stats = {
+            f"p{p}": values[min(len(values) - 1, max(0, math.ceil(p / 100 * len(values)) - 1))]
+            for p in percents
+        }
+        stats['max'] = values[-1]
+        return stats
+
+    def summary(self) -> dict:
+        with self._lock:
+            window = len(self._records)
+            outcomes = dict(self.outcomes)
+        summary = {'runs': self.total_runs, 'window': window, 'outcomes': outcomes}
+        for metric in self.METRICS:
+            summary[metric] = self.percentiles(metric)
+        return summary
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"\n📈 실행 통계 (최근 {summary['window']}건 / 누적 {summary['runs']}건)")
+        print(f"   종료 원인: {summary['outcomes']}")
+        for metric in self.METRICS:
+            stats = summary[metric]
+            if stats:
+                print(f"   {metric:<16} " + "  ".join(f"{k}={v:,}" for k, v in stats.items()))
+
 
 class SafeExecutor:
     """subprocess + resource limits 기반 안전한 코드 실행기"""
@@ -133,6 +319,18 @@ class SafeExecutor:
         self.file_limit = file_limit
         self.proc_limit = proc_limit
         self.timeout = timeout
+        self.stats = ExecutionStats()         # 최근 실행들의 자원 사용량 집계
+
+    def _build_wrapper(self, user_code: str) -> str:
+        """resource limits + 환경 격리 + 사용자 코드로 구성된 wrapper 스크립트"""
+        return SANDBOX_WRAPPER.format(
+            cpu_limit=self.cpu_limit,
+            cpu_hard_limit=self.cpu_limit,
+            mem_limit=self.mem_limit,
+            file_limit=self.file_limit,
+            proc_limit=self.proc_limit,
+            user_code=user_code,
+        )
 
     def execute(self, user_code: str) -> dict:
         """
@@ -143,15 +341,11 @@ class SafeExecutor:
         2. resource limits (CPU/메모리/파일/프로세스)
         3. 환경변수 격리 (민감 정보 제거)
         4. subprocess timeout (무한루프 최후 방어)
+
+        결과의 'resources'에는 os.wait4로 수거한 자식의 CPU/최대 RSS/I/O 사용량이 담깁니다.
         """
         # wrapper 스크립트 생성
-        wrapper_code = SANDBOX_WRAPPER.format(
-            cpu_limit=self.cpu_limit,
-            mem_limit=self.mem_limit,
-            file_limit=self.file_limit,
-            proc_limit=self.proc_limit,
-            user_code=textwrap.indent(user_code, '    '),
-        )
+        wrapper_code = self._build_wrapper(user_code)
 
         start_time = time.time()
         result = {
@@ -161,43 +355,320 @@ class SafeExecutor:
             'elapsed': 0,
             'exit_code': None,
             'killed_by': None,
+            'resources': None,
         }
 
+        # subprocess.run 대신 Popen + os.wait4: 자식의 자원 사용량까지 수거
+        proc = subprocess.Popen(
+            [sys.executable, '-c', wrapper_code],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=SANDBOX_ENV,  # 최소 환경변수만 전달
+            start_new_session=True,
+        )
+        output = {'stdout': bytearray(), 'stderr': bytearray()}
+        deadline = time.monotonic() + self.timeout
         try:
-            proc_result = subprocess.run(
-                [sys.executable, '-c', wrapper_code],
-                capture_output=True,
-                timeout=self.timeout,
-                text=True,
-                env={  # 최소 환경변수만 전달
-                    'PATH': '/usr/bin:/bin:/usr/local/bin',
-                    'PYTHONPATH': '',
-                    'HOME': '/tmp',
-                    'LANG': 'en_US.UTF-8',
-                },
-            )
+            with selectors.DefaultSelector() as selector:
+                selector.register(proc.stdout, selectors.EVENT_READ, 'stdout')
+                selector.register(proc.stderr, selectors.EVENT_READ, 'stderr')
+                while selector.get_map():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    for key, _ in selector.select(remaining):
+                        data = os.read(key.fd, 65536)
+                        if data:
+                            output[key.data] += data
+                        else:
+                            selector.unregister(key.fileobj)
+            # 자식이 stdout/stderr를 닫고 계속 실행될 수 있으므로 수거도 같은 deadline까지만 기다림
+            reaped = _reap(proc, deadline)
+            if reaped is None:
+                result['killed_by'] = 'TIMEOUT'
+                _kill_process_group(proc.pid)
+                reaped = _reap(proc)
+            returncode, result['resources'] = reaped
+        finally:
+            if proc.returncode is None:
+                _kill_process_group(proc.pid)
+                _reap(proc)
+            proc.stdout.close()
+            proc.stderr.close()
 
-            result['success'] = proc_result.returncode == 0
-            result['stdout'] = proc_result.stdout
-            result['stderr'] = proc_result.stderr
-            result['exit_code'] = proc_result.returncode
+        result['exit_code'] = returncode
+        if result['killed_by'] == 'TIMEOUT':
+            result['stderr'] = f"⏰ 실행 시간 제한 초과 ({self.timeout}초)"
+        else:
+            result['success'] = returncode == 0
+            result['stdout'] = output['stdout'].decode('utf-8', errors='replace')
+            result['stderr'] = output['stderr'].decode('utf-8', errors='replace')
 
             # exit code 해석
-            if proc_result.returncode < 0:
-                import signal as sig
-                try:
-                    signal_name = sig.Signals(-proc_result.returncode).name
-                    result['killed_by'] = signal_name
-                except Exception:
-                    result['killed_by'] = f"Signal {-proc_result.returncode}"
+            if returncode < 0:
+                result['killed_by'] = _signal_name(returncode)
 
-        except subprocess.TimeoutExpired:
+        result['elapsed'] = round(time.time() - start_time, 3)
+        self.stats.record(result)
+        return result
+
+    async def execute_async(self, user_code: str) -> dict:
+        """
+        execute()의 asyncio 버전. 이벤트 루프를 막지 않고 자식 프로세스를 기다립니다.
+
+        자식은 새 세션(프로세스 그룹)에서 실행되므로, 타임아웃이나 취소 시
+        자식이 만든 손자 프로세스까지 그룹 단위로 종료합니다.
+
+        자식 수거는 asyncio가 담당하므로 'resources'는 RUSAGE_CHILDREN 전후 차이입니다.
+        동시에 끝난 다른 자식의 사용량이 섞일 수 있고, 최대 RSS는 None입니다.
+        """
+        wrapper_code = self._build_wrapper(user_code)
+
+        start_time = time.time()
+        result = {
+            'success': False,
+            'stdout': '',
+            'stderr': '',
+            'elapsed': 0,
+            'exit_code': None,
+            'killed_by': None,
+            'resources': None,
+        }
+
+        usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, '-c', wrapper_code,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=SANDBOX_ENV,
+            start_new_session=True,
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            _kill_process_group(proc.pid)
+            await proc.wait()
+            result['exit_code'] = proc.returncode
             result['killed_by'] = 'TIMEOUT'
             result['stderr'] = f"⏰ 실행 시간 제한 초과 ({self.timeout}초)"
+        except BaseException:
+            # 태스크 취소 등 — 자식을 남겨두지 않고, 다시 취소돼도 수거는 끝나도록 shield
+            _kill_process_group(proc.pid)
+            await asyncio.shield(proc.wait())
+            raise
+        else:
+            result['success'] = proc.returncode == 0
+            result['stdout'] = stdout.decode('utf-8', errors='replace')
+            result['stderr'] = stderr.decode('utf-8', errors='replace')
+            result['exit_code'] = proc.returncode
+            if proc.returncode < 0:
+                result['killed_by'] = _signal_name(proc.returncode)
 
+        result['resources'] = _rusage_to_dict(
+            resource.getrusage(resource.RUSAGE_CHILDREN), usage_before, with_peak=False
+        )
         result['elapsed'] = round(time.time() - start_time, 3)
+        self.stats.record(result)
         return result
 
+    async def execute_many(self, codes, concurrency: Optional[int] = None) -> list:
+        """
+        여러 코드를 동시에 실행하고 입력 순서대로 결과 리스트를 반환합니다.
+        동시 실행 수는 세마포어로 제한합니다. (기본: CPU 코어 수)
+        """
+        semaphore = asyncio.Semaphore(concurrency or os.cpu_count() or 1)
+
+        async def run_one(code: str) -> dict:
+            async with semaphore:
+                return await self.execute_async(code)
+
+        return await asyncio.gather(*(run_one(code) for code in codes))
+
+    def execute_stream(self, user_code: str, max_output_bytes: int = 1024 * 1024):
+        """
+        코드를 실행하면서 출력을 도착하는 대로 내보내는 제너레이터.
+
+        yield ('stdout' | 'stderr', 텍스트 청크) 를 반복하고,
+        마지막에 ('exit', 결과 dict) 를 한 번 내보냅니다.
+        출력은 부모에 쌓지 않으므로 결과 dict의 stdout/stderr에는 담기지 않습니다.
+
+        stdout+stderr 합계가 max_output_bytes를 넘으면 잘림 표시를 붙이고
+        자식 프로세스 그룹을 종료합니다. (killed_by='OUTPUT_LIMIT')
+        """
+        start_time = time.time()
+        result = {
+            'success': False,
+            'stdout': '',
+            'stderr': '',
+            'elapsed': 0,
+            'exit_code': None,
+            'killed_by': None,
+            'resources': None,
+        }
+
+        proc = subprocess.Popen(
+            [sys.executable, '-c', self._build_wrapper(user_code)],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=STREAM_ENV,
+            start_new_session=True,
+        )
+        limiter = _OutputLimiter(max_output_bytes)
+        deadline = time.monotonic() + self.timeout
+
+        try:
+            with selectors.DefaultSelector() as selector:
+                selector.register(proc.stdout, selectors.EVENT_READ, 'stdout')
+                selector.register(proc.stderr, selectors.EVENT_READ, 'stderr')
+
+                while selector.get_map() and not result['killed_by']:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        result['killed_by'] = 'TIMEOUT'
+                        break
+                    for key, _ in selector.select(remaining):
+                        data = os.read(key.fd, 65536)
+                        if not data:
+                            selector.unregister(key.fileobj)
+                            text = limiter.flush(key.data)
+                        else:
+                            text = limiter.feed(key.data, data)
+                        if text:
+                            yield key.data, text
+                        if limiter.truncated:
+                            result['killed_by'] = 'OUTPUT_LIMIT'
+                            break
+
+            if result['killed_by']:
+                _kill_process_group(proc.pid)
+                reaped = _reap(proc)
+            else:
+                # 파이프가 모두 닫혀도 자식은 살아 있을 수 있으므로 수거도 deadline까지만 대기
+                reaped = _reap(proc, deadline)
+                if reaped is None:
+                    result['killed_by'] = 'TIMEOUT'
+                    _kill_process_group(proc.pid)
+                    reaped = _reap(proc)
+            _, result['resources'] = reaped
+        finally:
+            # 소비자가 중간에 멈춰도(generator close) 자식을 남기지 않음
+            if proc.returncode is None:
+                _kill_process_group(proc.pid)
+                _reap(proc)
+            proc.stdout.close()
+            proc.stderr.close()
+
+        result['exit_code'] = proc.returncode
+        if result['killed_by'] == 'TIMEOUT':
+            result['stderr'] = f"⏰ 실행 시간 제한 초과 ({self.timeout}초)"
+        elif result['killed_by'] == 'OUTPUT_LIMIT':
+            result['stderr'] = f"✂️  출력 제한 초과 ({max_output_bytes:,} bytes)"
+        else:
+            result['success'] = proc.returncode == 0
+            if proc.returncode < 0:
+                result['killed_by'] = _signal_name(proc.returncode)
+
+        result['elapsed'] = round(time.time() - start_time, 3)
+        self.stats.record(result)
+        yield 'exit', result
+
+    async def execute_stream_async(self, user_code: str, max_output_bytes: int = 1024 * 1024):
+        """
+        execute_stream()의 async 제너레이터 버전. (async for로 소비)
+
+        출력 청크는 작은 큐를 거쳐 전달되므로, 소비자가 느리면
+        파이프가 차서 자식 프로세스의 쓰기가 멈춥니다. (부모 메모리 일정)
+        """
+        start_time = time.time()
+        result = {
+            'success': False,
+            'stdout': '',
+            'stderr': '',
+            'elapsed': 0,
+            'exit_code': None,
+            'killed_by': None,
+            'resources': None,
+        }
+
+        usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, '-c', self._build_wrapper(user_code),
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=STREAM_ENV,
+            start_new_session=True,
+        )
+        limiter = _OutputLimiter(max_output_bytes)
+        chunks = asyncio.Queue(maxsize=16)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+
+        async def pump(name: str, reader: asyncio.StreamReader):
+            while True:
+                data = await reader.read(65536)
+                await chunks.put((name, data))
+                if not data:
+                    return
+
+        pumps = [
+            asyncio.ensure_future(pump('stdout', proc.stdout)),
+            asyncio.ensure_future(pump('stderr', proc.stderr)),
+        ]
+        try:
+            open_streams = len(pumps)
+            while open_streams and not result['killed_by']:
+                try:
+                    name, data = await asyncio.wait_for(
+                        chunks.get(), timeout=max(deadline - loop.time(), 0)
+                    )
+                except asyncio.TimeoutError:
+                    result['killed_by'] = 'TIMEOUT'
+                    break
+                if not data:
+                    open_streams -= 1
+                    text = limiter.flush(name)
+                else:
+                    text = limiter.feed(name, data)
+                if text:
+                    yield name, text
+                if limiter.truncated:
+                    result['killed_by'] = 'OUTPUT_LIMIT'
+
+            if not result['killed_by']:
+                # 파이프가 모두 닫혀도 자식은 살아 있을 수 있으므로 수거도 deadline까지만 대기
+                try:
+                    await asyncio.wait_for(proc.wait(), timeout=max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    result['killed_by'] = 'TIMEOUT'
+            if result['killed_by']:
+                _kill_process_group(proc.pid)
+            await proc.wait()
+        finally:
+            for task in pumps:
+                task.cancel()
+            if proc.returncode is None:
+                _kill_process_group(proc.pid)
+                await proc.wait()
+
+        result['exit_code'] = proc.returncode
+        if result['killed_by'] == 'TIMEOUT':
+            result['stderr'] = f"⏰ 실행 시간 제한 초과 ({self.timeout}초)"
+        elif result['killed_by'] == 'OUTPUT_LIMIT':
+            result['stderr'] = f"✂️  출력 제한 초과 ({max_output_bytes:,} bytes)"
+        else:
+            result['success'] = proc.returncode == 0
+            if proc.returncode < 0:
+                result['killed_by'] = _signal_name(proc.returncode)
+
+        result['resources'] = _rusage_to_dict(
+            resource.getrusage(resource.RUSAGE_CHILDREN), usage_before, with_peak=False
+        )
+        result['elapsed'] = round(time.time() - start_time, 3)
+        self.stats.record(result)
+        yield 'exit', result
+
     def print_config(self):
         """현재 설정 출력"""
         print(f"\n⚙️  SafeExecutor 설정:")
@@ -280,6 +751,18 @@ infinite_recursion()
         "desc": "재귀 호출로 스택을 소진하는 코드",
         "expect": "RecursionError",
     },
+    "7": {
+        "name": "🙈 출력 파이프 닫고 버티기 (타임아웃 우회 테스트)",
+        "code": """
+import os, time
+print("stdout/stderr를 닫고 대기...", flush=True)
+os.close(1)
+os.close(2)
+time.sleep(60)
+""",
+        "desc": "출력 파이프가 EOF가 된 뒤에도 자식이 살아 있음 → 수거도 timeout 안에서만 대기",
+        "expect": "TIMEOUT (실행 시간 ≈ timeout)",
+    },
 }
 
 
@@ -306,6 +789,14 @@ def run_scenario(executor: SafeExecutor, scenario_id: str):
     if result['killed_by']:
         print(f"⛔ 종료 원인: {result['killed_by']}")
 
+    resources = result['resources']
+    if resources:
+        peak = resources['peak_rss_bytes']
+        peak_str = f"{peak / (1024 * 1024):.1f}MB" if peak is not None else "-"
+        print(f"🧮 자원: CPU user {resources['user_cpu']}초 / sys {resources['sys_cpu']}초, "
+              f"최대 RSS {peak_str}, 페이지 폴트 {resources['minor_faults']:,}, "
+              f"컨텍스트 스위치 {resources['voluntary_ctx_switches']}/{resources['involuntary_ctx_switches']}")
+
     if result['stdout']:
         print(f"\n📤 출력:\n{textwrap.indent(result['stdout'].strip(), '   ')}")
 
@@ -318,6 +809,789 @@ def run_scenario(executor: SafeExecutor, scenario_id: str):
         print(f"\n🛡️  제한에 의해 종료됨")
 
 
+# ============================================================
+# 섹션 4: 워커 풀 — 미리 띄워둔 샌드박스 프로세스 재사용
+# ============================================================
+# subprocess 모드는 실행마다 Python 인터프리터를 새로 띄우므로
+# 매번 수십 ms의 기동 비용을 냅니다. 워커 풀은 resource limits와
+# 환경 격리가 이미 적용된 워커를 미리 띄워두고 파이프로 작업을 넘깁니다.
+#
+# 프로토콜: 4바이트 길이(big-endian) + UTF-8 JSON 메시지
+#   부모 → 워커: {"code": "..."}
+#   워커 → 부모: {"success", "stdout", "stderr", "exit_code", "limit_hit",
+#                "rusage_before", "rusage_after"}  (RUSAGE_SELF 작업 전후)
+
+WORKER_LOOP = """
+# ── 워커 루프 ───────────────────────────────────────────
+import errno
+import io
+import json
+import struct
+import traceback
+
+_JOB_FD, _RESULT_FD = int(sys.argv[1]), int(sys.argv[2])
+_WORKER_PID = os.getpid()
+_CPU_LIMIT = {cpu_limit}
+
+
+def _read_exact(fd, size):
+    buf = b''
+    while len(buf) < size:
+        chunk = os.read(fd, size - len(buf))
+        if not chunk:
+            raise EOFError
+        buf += chunk
+    return buf
+
+
+def _send(fd, message):
+    data = json.dumps(message).encode('utf-8')
+    data = struct.pack('>I', len(data)) + data
+    while data:
+        data = data[os.write(fd, data):]
+
+
+while True:
+    try:
+        (size,) = struct.unpack('>I', _read_exact(_JOB_FD, 4))
+        job = json.loads(_read_exact(_JOB_FD, size).decode('utf-8'))
+    except EOFError:
+        break
+
+    # RLIMIT_CPU는 프로세스 누적값(정수 초)이므로 작업마다 soft 한도를 다시 잡는다
+    # (사용량을 반올림해 작업별 허용량이 cpu_limit ± 0.5초 — 올림이면 최대 1초 더 받음)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = round(usage.ru_utime + usage.ru_stime)
+    _, cpu_hard = resource.getrlimit(resource.RLIMIT_CPU)
+    resource.setrlimit(resource.RLIMIT_CPU, (min(used + _CPU_LIMIT, cpu_hard), cpu_hard))
+
+    out, err = io.StringIO(), io.StringIO()
+    namespace = {{'__name__': '__main__', '__builtins__': __builtins__}}
+    exit_code, limit_hit = 0, False
+    sys.stdout, sys.stderr = out, err
+    try:
+        exec(compile(job['code'], '<sandbox>', 'exec'), namespace)
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            exit_code = e.code or 0
+        else:
+            print(e.code, file=err)
+            exit_code = 1
+    except BaseException as e:
+        namespace.clear()  # 메모리 폭탄이 잡고 있던 객체부터 해제
+        traceback.print_exc()
+        exit_code = 1
+        limit_hit = isinstance(e, (MemoryError, BlockingIOError)) or (
+            isinstance(e, OSError) and e.errno == errno.EFBIG
+        )
+    finally:
+        sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+        namespace.clear()
+
+    # 사용자 코드가 fork한 자식은 작업 파이프를 훔쳐가지 못하게 즉시 종료
+    if os.getpid() != _WORKER_PID:
+        os._exit(0)
+
+    try:
+        _send(_RESULT_FD, {{
+            'success': exit_code == 0,
+            'stdout': out.getvalue(),
+            'stderr': err.getvalue(),
+            'exit_code': exit_code,
+            'limit_hit': limit_hit,
+            'rusage_before': list(usage),
+            'rusage_after': list(resource.getrusage(resource.RUSAGE_SELF)),
+        }})
+    except MemoryError:
+        os._exit(1)
+    if limit_hit:
+        break
+"""
+
+
+def _send_message(fd: int, message: dict):
+    """길이 프리픽스 JSON 메시지 전송"""
+    data = json.dumps(message).encode('utf-8')
+    data = struct.pack('>I', len(data)) + data
+    while data:
+        data = data[os.write(fd, data):]
+
+
+class _MessageReader:
+    """파이프에서 길이 프리픽스 JSON 메시지를 연속으로 읽는 버퍼드 리더"""
+
+    def __init__(self, fd: int):
+        self.fd = fd
+        self._buf = b''
+
+    def recv(self, deadline: Optional[float] = None) -> dict:
+        """
+        메시지 하나를 수신합니다.
+        deadline(time.monotonic 기준) 초과 시 TimeoutError, EOF 시 EOFError.
+        """
+        while True:
+            if len(self._buf) >= 4:
+                (size,) = struct.unpack('>I', self._buf[:4])
+                if len(self._buf) >= 4 + size:
+                    data, self._buf = self._buf[4:4 + size], self._buf[4 + size:]
+                    return json.loads(data.decode('utf-8'))
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError
+                ready, _, _ = select.select([self.fd], [], [], remaining)
+                if not ready:
+                    raise TimeoutError
+            chunk = os.read(self.fd, 65536)
+            if not chunk:
+                raise EOFError
+            self._buf += chunk
+
+
+class _SandboxWorker:
+    """풀에 속한 워커 프로세스 하나 (프로세스 + 작업/결과 파이프)"""
+
+    def __init__(self, script: str):
+        job_r, self.job_w = os.pipe()
+        self.result_r, result_w = os.pipe()
+        try:
+            self.proc = subprocess.Popen(
+                [sys.executable, '-c', script, str(job_r), str(result_w)],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                env=SANDBOX_ENV,
+                pass_fds=(job_r, result_w),
+            )
+        except Exception:
+            os.close(self.job_w)
+            os.close(self.result_r)
+            raise
+        finally:
+            os.close(job_r)
+            os.close(result_w)
+        self.reader = _MessageReader(self.result_r)
+        self.jobs_done = 0
+
+    def retire(self):
+        """파이프를 닫고 프로세스를 확실히 종료"""
+        for fd in (self.job_w, self.result_r):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+
+
+# 풀 대기열에 넣는 표식
+_RESPAWN = object()       # 워커 재생성에 실패한 자리 — 다음에 빌리는 요청이 다시 띄움
+_POOL_CLOSED = object()   # close() 이후 get()에서 기다리는 요청을 깨움 (꺼낸 쪽이 다시 넣어 전파)
+
+
+class WorkerPoolExecutor(SafeExecutor):
+    """
+    미리 띄워둔 샌드박스 워커를 재사용하는 실행기.
+
+    execute()는 SafeExecutor와 같은 결과 dict를 반환합니다.
+    워커는 여러 작업을 순서대로 처리하므로 subprocess 모드보다 격리가 약합니다.
+    (작업마다 새 namespace를 쓰지만 sys.modules 등 프로세스 상태는 공유)
+    그래서 N개 작업 처리 후, 또는 제한에 걸리면 워커를 폐기하고 새로 띄웁니다.
+    """
+
+    def __init__(
+        self,
+        cpu_limit: int = 5,
+        mem_limit: int = 64 * 1024 * 1024,
+        file_limit: int = 1024 * 1024,
+        proc_limit: int = 10,
+        timeout: int = 10,
+        pool_size: int = 4,                  # 동시에 유지할 워커 수
+        max_jobs_per_worker: int = 50,       # 이 횟수만큼 처리하면 워커 재생성
+        max_queue: int = 64,                 # 워커를 기다릴 수 있는 최대 요청 수
+        recycle_on_error: bool = False,      # 예외로 끝난 작업 뒤에도 워커 재생성
+    ):
+        super().__init__(cpu_limit, mem_limit, file_limit, proc_limit, timeout)
+        self.pool_size = pool_size
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.max_queue = max_queue
+        self.recycle_on_error = recycle_on_error
+
+        # 워커는 여러 작업의 CPU 시간을 누적하므로 hard 한도를 넉넉히 두고
+        # 작업마다 soft 한도를 (사용량 + cpu_limit)로 다시 설정합니다.
+        self._script = (SANDBOX_PRELUDE + WORKER_LOOP).format(
+            cpu_limit=cpu_limit,
+            cpu_hard_limit=(cpu_limit + 1) * (max_jobs_per_worker + 1),
+            mem_limit=mem_limit,
+            file_limit=file_limit,
+            proc_limit=proc_limit,
+        )
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._closed = False
+        for _ in range(pool_size):
+            self._idle.put(_SandboxWorker(self._script))
+
+    def execute(self, user_code: str) -> dict:
+        """풀의 워커 하나를 빌려 코드를 실행합니다."""
+        start_time = time.time()
+        result = {
+            'success': False,
+            'stdout': '',
+            'stderr': '',
+            'elapsed': 0,
+            'exit_code': None,
+            'killed_by': None,
+            'resources': None,
+        }
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("이미 종료된 WorkerPoolExecutor입니다.")
+            if self._pending >= self.pool_size + self.max_queue:
+                result['killed_by'] = 'QUEUE_FULL'
+                result['stderr'] = f"🚦 대기열 초과 (최대 {self.max_queue}건 대기)"
+                self.stats.record(result)
+                return result
+            self._pending += 1
+
+        try:
+            try:
+                worker = self._acquire()
+            except OSError as e:
+                result['killed_by'] = 'SPAWN_FAILED'
+                result['stderr'] = f"🚫 워커 프로세스를 띄우지 못했습니다: {e}"
+            else:
+                recycle = True
+                try:
+                    recycle = self._run_on_worker(worker, user_code, result)
+                finally:
+                    self._release(worker, recycle)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+        result['elapsed'] = round(time.time() - start_time, 3)
+        self.stats.record(result)
+        return result
+
+    def _run_on_worker(self, worker: _SandboxWorker, user_code: str, result: dict) -> bool:
+        """워커에서 작업 하나를 실행하고 result를 채웁니다. 워커를 폐기해야 하면 True."""
+        deadline = time.monotonic() + self.timeout
+        try:
+            _send_message(worker.job_w, {'code': user_code})
+            reply = worker.reader.recv(deadline)
+        except TimeoutError:
+            result['killed_by'] = 'TIMEOUT'
+            result['stderr'] = f"⏰ 실행 시간 제한 초과 ({self.timeout}초)"
+            return True
+        except (EOFError, OSError):
+            # 워커가 시그널(SIGXCPU, SIGKILL 등)로 죽은 경우
+            try:
+                returncode = worker.proc.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                returncode = None
+            result['exit_code'] = returncode
+            if returncode is not None and returncode < 0:
+                result['killed_by'] = _signal_name(returncode)
+            return True
+
+        result['success'] = reply['success']
+        result['stdout'] = reply['stdout']
+        result['stderr'] = reply['stderr']
+        result['exit_code'] = reply['exit_code']
+        # 워커는 여러 작업을 처리하므로 누적 항목은 작업 전후 차이,
+        # 최대 RSS는 워커 프로세스 전체 기준입니다.
+        result['resources'] = _rusage_to_dict(
+            resource.struct_rusage(reply['rusage_after']),
+            resource.struct_rusage(reply['rusage_before']),
+        )
+        return reply['limit_hit'] or (self.recycle_on_error and not reply['success'])
+
+    def _acquire(self) -> _SandboxWorker:
+        """유휴 워커를 빌림. 종료된 풀이면 RuntimeError, 빈 자리를 채우지 못하면 OSError"""
+        worker = self._idle.get()
+        if worker is _POOL_CLOSED:
+            self._idle.put(worker)
+            raise RuntimeError("이미 종료된 WorkerPoolExecutor입니다.")
+        if worker is _RESPAWN:
+            try:
+                worker = _SandboxWorker(self._script)
+            except OSError:
+                self._idle.put(_RESPAWN)
+                raise
+        return worker
+
+    def _release(self, worker: _SandboxWorker, recycle: bool):
+        """워커를 풀에 반납하거나, 재활용 정책에 따라 새 워커로 교체"""
+        worker.jobs_done += 1
+        if recycle or worker.jobs_done >= self.max_jobs_per_worker or self._closed:
+            worker.retire()
+            if self._closed:
+                return
+            try:
+                worker = _SandboxWorker(self._script)
+            except OSError:
+                worker = _RESPAWN   # 풀 크기는 유지하고 다음 요청에서 다시 시도
+        with self._lock:
+            if not self._closed:
+                self._idle.put(worker)
+                return
+        if worker is not _RESPAWN:
+            worker.retire()
+
+    async def execute_async(self, user_code: str) -> dict:
+        """execute()를 스레드로 넘겨 이벤트 루프를 막지 않습니다. (execute는 스레드 안전)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.execute, user_code)
+
+    def close(self):
+        """모든 워커 종료 (실행 중인 워커는 반납 시점에 종료됨)"""
+        idle = []
+        with self._lock:
+            self._closed = True
+            while True:
+                try:
+                    idle.append(self._idle.get_nowait())
+                except queue.Empty:
+                    break
+            self._idle.put(_POOL_CLOSED)
+        for worker in idle:
+            if isinstance(worker, _SandboxWorker):
+                worker.retire()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def print_config(self):
+        super().print_config()
+        print(f"   워커 수:        {self.pool_size}개")
+        print(f"   워커 재생성:     {self.max_jobs_per_worker}건마다 / 제한 초과 시")
+        print(f"   대기열:         최대 {self.max_queue}건")
+
+
+# ============================================================
+# 섹션 5: Zygote(fork-server) — 미리 import 후 작업마다 fork
+# ============================================================
+# zygote 프로세스가 허용 모듈을 미리 import해 두고, 작업마다 os.fork()로
+# 자식을 만듭니다. 자식은 copy-on-write로 import 결과를 그대로 물려받고
+# resource limits를 적용한 뒤 사용자 코드를 실행하고 버려집니다.
+# → 작업당 비용은 fork 한 번, 격리 단위는 여전히 "작업당 프로세스 1개"
+#
+# 부모 → zygote: {"id", "code"}
+# zygote → 부모: {"id", "stdout", "stderr", "exit_code", "timed_out", "rusage"}
+
+# 어떤 작업의 응답도 없이 (timeout + 이 시간)이 지나면 zygote가 멈춘 것으로 보고 교체
+ZYGOTE_HANG_MARGIN = 5.0
+
+DEFAULT_PRELOAD_MODULES = (
+    'math', 'json', 'statistics', 're', 'random', 'collections',
+    'itertools', 'functools', 'datetime', 'decimal', 'fractions',
+)
+
+ZYGOTE_LOOP = """
+# ── Zygote 루프 ─────────────────────────────────────────
+import collections
+import json
+import resource
+import select
+import signal
+import struct
+import sys
+import time
+import traceback
+
+_JOB_FD, _RESULT_FD = int(sys.argv[1]), int(sys.argv[2])
+_LIMITS = compile({limits_src!r}, '<limits>', 'exec')
+_MAX_CHILDREN = {max_children}
+_TIMEOUT = {timeout}
+
+# 허용 모듈 미리 import → fork된 자식이 그대로 물려받음
+for _name in {preload_modules!r}:
+    try:
+        __import__(_name)
+    except ImportError:
+        pass
+
+
+def _send(message):
+    data = json.dumps(message).encode('utf-8')
+    data = struct.pack('>I', len(data)) + data
+    while data:
+        data = data[os.write(_RESULT_FD, data):]
+
+
+def _run_child(job, out_w, err_w):
+    # fork된 자식: 프로세스 그룹 분리 → 출력 연결 → 제한 적용 → 사용자 코드 실행
+    exit_code = 1
+    try:
+        os.setpgid(0, 0)
+        os.dup2(out_w, 1)
+        os.dup2(err_w, 2)
+        os.closerange(3, resource.getrlimit(resource.RLIMIT_NOFILE)[0])
+        exec(_LIMITS, {{}})
+        exit_code = 0
+        try:
+            exec(compile(job['code'], '<sandbox>', 'exec'),
+                 {{'__name__': '__main__', '__builtins__': __builtins__}})
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                exit_code = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+                exit_code = 1
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(exit_code)
+
+
+running = {{}}      # pid → 작업 상태
+fd_owner = {{}}     # 출력 파이프 fd → (pid, 'out' | 'err')
+pending = collections.deque()
+buf = b''
+jobs_open = True
+
+
+def _start(job):
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        _run_child(job, out_w, err_w)
+    try:
+        os.setpgid(pid, pid)  # 자식의 setpgid와 경쟁하지 않도록 부모에서도 설정
+    except OSError:
+        pass
+    os.close(out_w)
+    os.close(err_w)
+    running[pid] = {{
+        'id': job['id'], 'out': bytearray(), 'err': bytearray(), 'open': 2,
+        'status': None, 'rusage': None,
+        'deadline': time.monotonic() + _TIMEOUT, 'timed_out': False,
+    }}
+    fd_owner[out_r] = (pid, 'out')
+    fd_owner[err_r] = (pid, 'err')
+
+
+def _finish(pid):
+    job = running.pop(pid)
+    for fd, (owner, _) in list(fd_owner.items()):
+        if owner == pid:
+            os.close(fd)
+            del fd_owner[fd]
+    if job['status'] is None:
+        os.kill(pid, signal.SIGKILL)
+        _, job['status'], job['rusage'] = os.wait4(pid, 0)
+    status = job['status']
+    exit_code = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    _send({{
+        'id': job['id'],
+        'stdout': job['out'].decode('utf-8', errors='replace'),
+        'stderr': job['err'].decode('utf-8', errors='replace'),
+        'exit_code': exit_code,
+        'timed_out': job['timed_out'],
+        'rusage': list(job['rusage']),
+    }})
+
+
+while jobs_open:
+    while pending and len(running) < _MAX_CHILDREN:
+        _start(pending.popleft())
+
+    now = time.monotonic()
+    wait = None
+    for job in running.values():
+        # 출력이 모두 닫혔으면 종료 상태 수거를 위해 짧게 폴링
+        job_wait = 0.005 if job['open'] == 0 else job['deadline'] - now
+        wait = job_wait if wait is None else min(wait, job_wait)
+
+    ready, _, _ = select.select(
+        [_JOB_FD] + list(fd_owner), [], [], None if wait is None else max(wait, 0)
+    )
+    for fd in ready:
+        chunk = os.read(fd, 65536)
+        if fd == _JOB_FD:
+            if not chunk:
+                jobs_open = False
+                break
+            buf += chunk
+            while len(buf) >= 4:
+                (size,) = struct.unpack('>I', buf[:4])
+                if len(buf) < 4 + size:
+                    break
+                pending.append(json.loads(buf[4:4 + size].decode('utf-8')))
+                buf = buf[4 + size:]
+        elif chunk:
+            pid, stream = fd_owner[fd]
+            running[pid][stream] += chunk
+        else:
+            pid, _ = fd_owner.pop(fd)
+            os.close(fd)
+            running[pid]['open'] -= 1
+
+    now = time.monotonic()
+    for pid, job in list(running.items()):
+        if job['status'] is None:
+            # wait4: 종료 상태와 함께 자식의 자원 사용량(rusage)도 수거
+            done, status, rusage = os.wait4(pid, os.WNOHANG)
+            if done:
+                job['status'], job['rusage'] = status, rusage
+        if job['status'] is not None and job['open'] == 0:
+            _finish(pid)
+        elif now >= job['deadline']:
+            if job['timed_out']:
+                _finish(pid)  # 강제 종료 후에도 파이프가 남아 있으면 정리
+            else:
+                job['timed_out'] = True
+                job['deadline'] = now + 1
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except OSError:
+                    pass
+
+# 부모가 파이프를 닫으면 실행 중인 자식을 모두 정리하고 종료
+for pid in list(running):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass
+    os.waitpid(pid, 0)
+"""
+
+
+class ZygoteExecutor(SafeExecutor):
+    """
+    fork-server 방식 실행기.
+
+    zygote 프로세스 하나가 preload_modules를 미리 import한 뒤
+    작업마다 fork → resource limits 적용 → 사용자 코드 실행을 반복합니다.
+    execute()는 여러 스레드에서 동시에 호출할 수 있습니다.
+    """
+
+    def __init__(
+        self,
+        cpu_limit: int = 5,
+        mem_limit: int = 64 * 1024 * 1024,
+        file_limit: int = 1024 * 1024,
+        proc_limit: int = 10,
+        timeout: int = 10,
+        preload_modules=DEFAULT_PRELOAD_MODULES,   # zygote에서 미리 import할 모듈
+        max_children: Optional[int] = None,        # 동시에 실행할 자식 수 (기본: CPU 코어 수)
+    ):
+        super().__init__(cpu_limit, mem_limit, file_limit, proc_limit, timeout)
+        self.preload_modules = tuple(preload_modules)
+        self.max_children = max_children or os.cpu_count() or 1
+
+        limits_src = SANDBOX_LIMITS.format(
+            cpu_limit=cpu_limit,
+            cpu_hard_limit=cpu_limit,
+            mem_limit=mem_limit,
+            file_limit=file_limit,
+            proc_limit=proc_limit,
+        )
+        self._script = SANDBOX_ENV_SCRUB + ZYGOTE_LOOP.format(
+            limits_src=limits_src,
+            max_children=self.max_children,
+            timeout=timeout,
+            preload_modules=self.preload_modules,
+        )
+        self._lock = threading.Lock()       # _waiters / zygote 교체 보호
+        self._send_lock = threading.Lock()  # 작업 파이프 쓰기 직렬화
+        self._waiters = {}
+        self._next_id = 0
+        self._closed = False
+        self._zygote = None
+        self._start_zygote()
+
+    def _start_zygote(self):
+        zygote = _SandboxWorker(self._script)
+        zygote.last_reply = time.monotonic()   # 멈춤 감지용: 마지막으로 응답이 온 시각
+        self._zygote = zygote
+        threading.Thread(target=self._read_replies, args=(zygote,), daemon=True).start()
+
+    def _read_replies(self, zygote: _SandboxWorker):
+        """zygote 응답을 작업 id별 대기자에게 전달 (zygote당 스레드 1개)"""
+        while True:
+            try:
+                reply = zygote.reader.recv()
+            except (EOFError, OSError):
+                break
+            zygote.last_reply = time.monotonic()
+            with self._lock:
+                waiter = self._waiters.pop(reply['id'], None)
+            if waiter:
+                waiter['reply'] = reply
+                waiter['done'].set()
+
+        # zygote가 죽으면 남은 대기자를 모두 깨움
+        with self._lock:
+            if self._zygote is zygote:
+                self._zygote = None
+            orphans = [job_id for job_id, w in self._waiters.items() if w['zygote'] is zygote]
+            for job_id in orphans:
+                self._waiters.pop(job_id)['done'].set()
+
+    def execute(self, user_code: str) -> dict:
+        """zygote에서 fork한 자식 프로세스로 코드를 실행합니다."""
+        start_time = time.time()
+        result = {
+            'success': False,
+            'stdout': '',
+            'stderr': '',
+            'elapsed': 0,
+            'exit_code': None,
+            'killed_by': None,
+            'resources': None,
+        }
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("이미 종료된 ZygoteExecutor입니다.")
+            if self._zygote is None:
+                self._start_zygote()
+            zygote = self._zygote
+            job_id = self._next_id
+            self._next_id += 1
+            waiter = {'done': threading.Event(), 'reply': None, 'zygote': zygote}
+            self._waiters[job_id] = waiter
+
+        try:
+            with self._send_lock:
+                _send_message(zygote.job_w, {'id': job_id, 'code': user_code})
+        except OSError:
+            with self._lock:
+                self._waiters.pop(job_id, None)
+            waiter['done'].set()
+
+        # zygote가 죽지 않고 멈추면 응답이 영영 오지 않으므로, 어떤 작업의 응답도 없이
+        # timeout + 여유 시간이 지나면 zygote를 버림 (대기열에 밀린 작업은 다른 응답이 오는 한 계속 기다림)
+        wait_start = time.monotonic()
+        while not waiter['done'].is_set():
+            remaining = max(wait_start, zygote.last_reply) + self.timeout + ZYGOTE_HANG_MARGIN - time.monotonic()
+            if remaining <= 0:
+                self._abandon_zygote(zygote)
+                with self._lock:
+                    self._waiters.pop(job_id, None)
+                break
+            waiter['done'].wait(remaining)
+        reply = waiter['reply']
+
+        if reply is None:
+            result['killed_by'] = 'ZYGOTE_EXIT'
+            result['stderr'] = "💀 zygote 프로세스가 종료되어 실행하지 못했습니다."
+        elif reply['timed_out']:
+            result['stdout'] = reply['stdout']
+            result['exit_code'] = reply['exit_code']
+            result['killed_by'] = 'TIMEOUT'
+            result['stderr'] = f"⏰ 실행 시간 제한 초과 ({self.timeout}초)"
+        else:
+            result['success'] = reply['exit_code'] == 0
+            result['stdout'] = reply['stdout']
+            result['stderr'] = reply['stderr']
+            result['exit_code'] = reply['exit_code']
+            if reply['exit_code'] < 0:
+                result['killed_by'] = _signal_name(reply['exit_code'])
+        if reply is not None:
+            result['resources'] = _rusage_to_dict(resource.struct_rusage(reply['rusage']))
+
+        result['elapsed'] = round(time.time() - start_time, 3)
+        self.stats.record(result)
+        return result
+
+    def _abandon_zygote(self, zygote: _SandboxWorker):
+        """응답하지 않는 zygote를 종료하고, 다음 execute()가 새 zygote를 띄우게 함"""
+        with self._lock:
+            if self._zygote is zygote:
+                self._zygote = None
+        if zygote.proc.poll() is None:
+            zygote.proc.kill()
+
+    async def execute_async(self, user_code: str) -> dict:
+        """execute()를 스레드로 넘겨 이벤트 루프를 막지 않습니다. (execute는 스레드 안전)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.execute, user_code)
+
+    def close(self):
+        """zygote 종료 (파이프를 닫으면 zygote가 실행 중인 자식을 정리하고 종료)"""
+        with self._lock:
+            self._closed = True
+            zygote, self._zygote = self._zygote, None
+        if zygote is None:
+            return
+        try:
+            os.close(zygote.job_w)
+            zygote.proc.wait(timeout=2)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+        zygote.retire()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def print_config(self):
+        super().print_config()
+        print(f"   미리 import:    {', '.join(self.preload_modules)}")
+        print(f"   동시 자식 수:    {self.max_children}개")
+
+
+# ============================================================
+# 섹션 6: 실행 모드 벤치마크 (subprocess vs zygote vs 워커 풀)
+# ============================================================
+
+def run_benchmark(rounds: int = 3, warm_runs: int = 50):
+    """
+    DEMO_SCENARIOS 6개를 세 가지 실행 모드로 돌려 지연 시간을 비교합니다.
+    무한 루프 시나리오가 오래 걸리지 않도록 CPU 제한을 1초로 낮춰 측정합니다.
+    """
+    limits = dict(cpu_limit=1, timeout=3)
+    modes = [
+        ('subprocess', SafeExecutor(**limits)),
+        ('zygote', ZygoteExecutor(**limits)),
+        ('pool', WorkerPoolExecutor(**limits)),
+    ]
+    time.sleep(0.5)  # zygote/워커 기동 완료 대기 (측정에서 제외)
+
+    try:
+        print(f"\n📊 시나리오별 지연 시간 (중앙값 ms, {rounds}회)")
+        print(f"{'시나리오':<40}" + ''.join(f"{name:>12}" for name, _ in modes))
+        print("─" * (40 + 12 * len(modes)))
+        for scenario in DEMO_SCENARIOS.values():
+            row = f"{scenario['name'][:38]:<40}"
+            for _, executor in modes:
+                samples = []
+                for _ in range(rounds):
+                    t0 = time.perf_counter()
+                    executor.execute(scenario['code'])
+                    samples.append((time.perf_counter() - t0) * 1000)
+                row += f"{sorted(samples)[len(samples) // 2]:>12.1f}"
+            print(row)
+
+        print(f"\n🔥 정상 코드 {warm_runs}회 반복 (작업당 평균 ms / 초당 처리량)")
+        code = DEMO_SCENARIOS['1']['code']
+        for name, executor in modes:
+            t0 = time.perf_counter()
+            for _ in range(warm_runs):
+                executor.execute(code)
+            total = time.perf_counter() - t0
+            print(f"   {name:<12} {total / warm_runs * 1000:>8.2f} ms   {warm_runs / total:>8.1f} jobs/s")
+    finally:
+        for _, executor in modes:
+            if hasattr(executor, 'close'):
+                executor.close()
+
+
 # ============================================================
 # 메인: 대화형 인터페이스
 # ============================================================
@@ -331,6 +1605,10 @@ def print_banner():
 
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--bench':
+        run_benchmark(rounds=int(sys.argv[2]) if len(sys.argv) > 2 else 3)
+        sys.exit(0)
+
     print_banner()
 
     executor = SafeExecutor(
@@ -357,6 +1635,7 @@ if __name__ == '__main__':
         for key in DEMO_SCENARIOS:
             run_scenario(executor, key)
             input("\n   [Enter] 다음 시나리오...")
+        executor.stats.print_summary()
 
     elif choice == 'Q':
         print("\n💻 직접 코드를 입력하세요 (빈 줄 두 번으로 실행, 'exit'로 종료):")
@@ -389,4 +1668,4 @@ if __name__ == '__main__':
         run_scenario(executor, choice)
 
     else:
-        print("잘못된 선택입니다. 1~6, A, Q 중 선택하세요.")
+        print("잘못된 선택입니다. 1~7, A, Q 중 선택하세요.")